@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from api.endpoints import order, transfer, cancel_order, wallet, auth, freeze, unfreeze
+from api.endpoints import order, transfer, cancel_order, wallet, auth, freeze, unfreeze, broadcast, stream, tx
 
 api_router = APIRouter()
 api_router.include_router(auth.router)
@@ -8,4 +8,8 @@ api_router.include_router(order.router)
 api_router.include_router(transfer.router)
 api_router.include_router(cancel_order.router)
 api_router.include_router(freeze.router)
+api_router.include_router(unfreeze.router)
 api_router.include_router(wallet.router)
+api_router.include_router(broadcast.router)
+api_router.include_router(tx.router)
+api_router.include_router(stream.router)
@@ -6,3 +6,17 @@ class WalletPermission(str, Enum):
     TRANSFER = 'transfer'
     FREEZE = 'freeze'
     RESYNC = 'resync'
+
+
+class BroadcastStatus(str, Enum):
+    QUEUED = 'queued'
+    BROADCASTING = 'broadcasting'
+    SUCCESS = 'success'
+    FAILED = 'failed'
+
+
+class TxStatus(str, Enum):
+    PENDING = 'pending'
+    COMMITTED = 'committed'
+    FAILED = 'failed'
+    EXPIRED = 'expired'
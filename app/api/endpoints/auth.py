@@ -13,12 +13,12 @@ router = APIRouter()
 
 
 @router.post("/auth/login", response_model=Token, tags=["login"])
-def login(login_details: Login):
+async def login(login_details: Login):
     """
     OAuth2 compatible token login, get an access token for future requests
     """
     config = ServiceConfig()
-    user = user_authenticate(username=login_details.username, password=login_details.password)
+    user = await user_authenticate(username=login_details.username, password=login_details.password)
     if not user:
         raise HTTPException(status_code=400, detail=json.dumps({"error": "Incorrect email or password"}))
     access_token_expires = timedelta(minutes=config.settings.access_token_expiry_minutes)
@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends, HTTPException, Path
+
+from config.config import ServiceConfig, UserSettings
+from api.security.auth import get_current_user
+from api.utils.responses import FastJSONResponse
+
+router = APIRouter()
+
+
+@router.get("/broadcast/{ticket}", content_type=FastJSONResponse)
+async def broadcast_status(
+    ticket: str = Path(..., title="Broadcast ticket"),
+    current_user: UserSettings = Depends(get_current_user)
+):
+    """Get the status and result of a queued broadcast"""
+    config = ServiceConfig()
+
+    broadcast_ticket = config.get_broadcast_ticket(ticket)
+    if not broadcast_ticket or broadcast_ticket.username != current_user.username:
+        raise HTTPException(status_code=404, detail=f"Broadcast ticket {ticket} not found")
+
+    return broadcast_ticket.asdict()
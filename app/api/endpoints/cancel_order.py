@@ -1,18 +1,20 @@
-from fastapi import APIRouter, Depends, BackgroundTasks, Body
+from fastapi import APIRouter, Depends, Body, Header, Query
 
 from binance_chain.messages import CancelOrderMsg
 
-from config.config import WalletConfig, UserSettings
-from api.models.schema import SignCancelOrderSchema
+from config.config import UserSettings
+from api.models.schema import CancelOpenOrdersSchema, SignCancelOrderSchema
 from api.constants.constants import WalletPermission
-from api.utils.wallet import get_wallet, increment_wallet_sequence
-from api.security.auth import get_current_user, assert_user_has_wallet_permission, assert_wallet_has_permission
-from api.utils.logging import log_broadcast_transaction, log_sign_transaction
+from api.utils.responses import FastJSONResponse
+from api.utils.wallet import (
+    get_wallet, sign_msg, broadcast_msg, cancel_open_orders, should_refresh_open_orders, sync_open_orders
+)
+from api.security.auth import get_current_user
 
 router = APIRouter()
 
 
-@router.post("/order/cancel/sign/")
+@router.post("/order/cancel/sign/", content_type=FastJSONResponse)
 async def sign_cancel_order(
     cancel_order: SignCancelOrderSchema = Body(
         ...,
@@ -24,29 +26,21 @@ async def sign_cancel_order(
             "wallet_name": "wallet_1"
         }
     ),
-    req_wallet: WalletConfig = Depends(get_wallet),
-    current_user: UserSettings = Depends(get_current_user)
+    current_user: UserSettings = Depends(get_current_user),
+    idempotency_key: str = Header(None),
 ):
     """Sign a cancel order message, returning the hex data
 
     """
-    assert_wallet_has_permission(req_wallet, WalletPermission.TRADE)
-    assert_user_has_wallet_permission(current_user, cancel_order.wallet_name, WalletPermission.TRADE)
+    req_wallet = await get_wallet(cancel_order.wallet_name, current_user, WalletPermission.TRADE, priority=True)
 
-    # create the message
-    msg = CancelOrderMsg(
-        wallet=req_wallet.wallet,
-        **cancel_order.msg.dict()
+    return await sign_msg(
+        current_user, req_wallet, CancelOrderMsg, cancel_order.msg.dict(), idempotency_key=idempotency_key
     )
 
-    log_sign_transaction(current_user, req_wallet, msg)
-
-    return {'signed_msg': msg.to_hex_data()}
 
-
-@router.post("/order/cancel/broadcast")
+@router.post("/order/cancel/broadcast", content_type=FastJSONResponse)
 async def broadcast_cancel_order(
-    background_tasks: BackgroundTasks,
     cancel_order: SignCancelOrderSchema = Body(
         ...,
         example={
@@ -57,23 +51,79 @@ async def broadcast_cancel_order(
             "wallet_name": "wallet_1"
         }
     ),
-    req_wallet: WalletConfig = Depends(get_wallet),
     current_user: UserSettings = Depends(get_current_user),
-    sync=True
+    idempotency_key: str = Header(None),
+    sync=True,
+    queue: bool = False,
+    retry: bool = False,
 ):
     """Sign and broadcast a cancel order message to the exchange
 
+    Set queue to sign and queue the message for broadcast, returning a ticket to check its status
+
+    Set retry to sign and broadcast again if the sequence was rejected and the wallet resynced
+
     """
-    assert_wallet_has_permission(req_wallet, WalletPermission.TRADE)
-    assert_user_has_wallet_permission(current_user, cancel_order.wallet_name, WalletPermission.TRADE)
+    req_wallet = await get_wallet(cancel_order.wallet_name, current_user, WalletPermission.TRADE, priority=True)
 
-    # create the message
-    msg = CancelOrderMsg(
-        wallet=req_wallet.wallet,
-        **cancel_order.msg.dict()
+    return await broadcast_msg(
+        current_user, req_wallet, CancelOrderMsg, cancel_order.msg.dict(), sync=sync, queue=queue, retry=retry,
+        idempotency_key=idempotency_key
     )
 
-    log_broadcast_transaction(current_user, req_wallet, msg)
 
-    background_tasks.add_task(increment_wallet_sequence)
-    return await req_wallet.broadcast_msg(msg.to_hex_data(), sync=sync)
+@router.post("/order/cancel/all/broadcast", content_type=FastJSONResponse)
+async def broadcast_cancel_open_orders(
+    cancel_orders: CancelOpenOrdersSchema = Body(
+        ...,
+        example={
+            "symbol": "ANN-457_BNB",
+            "wallet_name": "wallet_1"
+        }
+    ),
+    current_user: UserSettings = Depends(get_current_user),
+    idempotency_key: str = Header(None),
+    sync: bool = True,
+    queue: bool = False,
+    refresh: bool = None,
+):
+    """Cancel all open orders of a wallet, or those of a symbol, packing the cancels into as few txs as allowed
+
+    Open orders are taken from the index the service keeps of each wallet, set refresh to sync it with the node first,
+    it defaults to on when worker processes share a sequence store
+
+    Every tx is signed up front and the txs broadcast back to back, set queue to hand them to the broadcast queue of
+    the wallet and return a ticket for each straight away
+
+    Returns the result or ticket of each tx with the ids of the orders it cancels
+
+    """
+    req_wallet = await get_wallet(cancel_orders.wallet_name, current_user, WalletPermission.TRADE, priority=True)
+
+    return await cancel_open_orders(
+        current_user, req_wallet, CancelOrderMsg, {'symbol': cancel_orders.symbol}, sync=sync, queue=queue,
+        refresh=refresh, idempotency_key=idempotency_key
+    )
+
+
+@router.get("/order/open", content_type=FastJSONResponse)
+async def open_orders(
+    wallet_name: str = Query(..., title="Wallet name"),
+    symbol: str = None,
+    refresh: bool = None,
+    current_user: UserSettings = Depends(get_current_user),
+):
+    """List the open orders the service has indexed for a wallet, or those of a symbol
+
+    Set refresh to sync the index with the node first, it defaults to on when worker processes share a sequence store.
+    Returns 502 if the node rejects the sync and 503 if it can't be reached.
+
+    """
+    req_wallet = await get_wallet(wallet_name, current_user, WalletPermission.TRADE)
+
+    index = req_wallet.open_orders
+    if refresh is None:
+        refresh = should_refresh_open_orders()
+    if refresh or not index.synced:
+        await sync_open_orders(req_wallet)
+    return [order.asdict() for order in index.orders(symbol)]
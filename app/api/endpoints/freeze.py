@@ -1,18 +1,18 @@
-from fastapi import APIRouter, Depends, BackgroundTasks, Body
+from fastapi import APIRouter, Depends, Body, Header
 
 from binance_chain.messages import FreezeMsg
 
-from config.config import WalletConfig, UserSettings
+from config.config import UserSettings
 from api.models.schema import SignFreezeSchema
 from api.constants.constants import WalletPermission
-from api.utils.wallet import get_wallet, increment_wallet_sequence
-from api.security.auth import get_current_user, assert_user_has_wallet_permission, assert_wallet_has_permission
-from api.utils.logging import log_broadcast_transaction, log_sign_transaction
+from api.utils.responses import FastJSONResponse
+from api.utils.wallet import get_wallet, sign_msg, broadcast_msg
+from api.security.auth import get_current_user
 
 router = APIRouter()
 
 
-@router.post("/freeze/sign")
+@router.post("/freeze/sign", content_type=FastJSONResponse)
 async def sign_freeze(
     freeze: SignFreezeSchema = Body(
         ...,
@@ -24,29 +24,19 @@ async def sign_freeze(
             "wallet_name": "wallet_1"
         }
     ),
-    req_wallet: WalletConfig = Depends(get_wallet),
-    current_user: UserSettings = Depends(get_current_user)
+    current_user: UserSettings = Depends(get_current_user),
+    idempotency_key: str = Header(None),
 ):
     """Sign a freeze message, returning the hex data
 
     """
-    assert_wallet_has_permission(req_wallet, WalletPermission.FREEZE)
-    assert_user_has_wallet_permission(current_user, freeze.wallet_name, WalletPermission.FREEZE)
-
-    # create the message
-    msg = FreezeMsg(
-        wallet=req_wallet.wallet,
-        **freeze.msg.dict()
-    )
-
-    log_sign_transaction(current_user, req_wallet, msg)
+    req_wallet = await get_wallet(freeze.wallet_name, current_user, WalletPermission.FREEZE)
 
-    return {'signed_msg': msg.to_hex_data()}
+    return await sign_msg(current_user, req_wallet, FreezeMsg, freeze.msg.dict(), idempotency_key=idempotency_key)
 
 
-@router.post("/freeze/broadcast")
+@router.post("/freeze/broadcast", content_type=FastJSONResponse)
 async def broadcast_freeze(
-    background_tasks: BackgroundTasks,
     freeze: SignFreezeSchema = Body(
         ...,
         example={
@@ -57,23 +47,22 @@ async def broadcast_freeze(
             "wallet_name": "wallet_1"
         }
     ),
-    req_wallet: WalletConfig = Depends(get_wallet),
     current_user: UserSettings = Depends(get_current_user),
+    idempotency_key: str = Header(None),
     sync: bool = True,
+    queue: bool = False,
+    retry: bool = False,
 ):
     """Sign and broadcast a freeze message to the exchange
 
-    """
-    assert_wallet_has_permission(req_wallet, WalletPermission.FREEZE)
-    assert_user_has_wallet_permission(current_user, freeze.wallet_name, WalletPermission.FREEZE)
+    Set queue to sign and queue the message for broadcast, returning a ticket to check its status
 
-    # create the message
-    msg = FreezeMsg(
-        wallet=req_wallet.wallet,
-        **freeze.msg.dict()
-    )
+    Set retry to sign and broadcast again if the sequence was rejected and the wallet resynced
 
-    log_broadcast_transaction(current_user, req_wallet, msg)
+    """
+    req_wallet = await get_wallet(freeze.wallet_name, current_user, WalletPermission.FREEZE)
 
-    background_tasks.add_task(increment_wallet_sequence, req_wallet)
-    return await req_wallet.broadcast_msg(msg.to_hex_data(), sync=sync)
+    return await broadcast_msg(
+        current_user, req_wallet, FreezeMsg, freeze.msg.dict(), sync=sync, queue=queue, retry=retry,
+        idempotency_key=idempotency_key
+    )
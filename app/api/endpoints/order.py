@@ -1,18 +1,18 @@
-from fastapi import APIRouter, Depends, BackgroundTasks, Body
+from fastapi import APIRouter, Depends, Body, Header
 
 from binance_chain.messages import NewOrderMsg
 
-from config.config import WalletConfig, UserSettings
-from api.models.schema import SignOrderSchema
+from config.config import UserSettings
+from api.models.schema import SignOrderSchema, SignOrderBatchSchema, SignOrderLadderSchema
 from api.constants.constants import WalletPermission
-from api.utils.wallet import get_wallet, increment_wallet_sequence
-from api.security.auth import get_current_user, assert_user_has_wallet_permission, assert_wallet_has_permission
-from api.utils.logging import log_broadcast_transaction, log_sign_transaction
+from api.utils.responses import FastJSONResponse
+from api.utils.wallet import get_wallet, sign_msg, broadcast_msg, sign_msgs, broadcast_msgs
+from api.security.auth import get_current_user
 
 router = APIRouter()
 
 
-@router.post("/order/sign")
+@router.post("/order/sign", content_type=FastJSONResponse)
 async def sign_order(
     signed_order: SignOrderSchema = Body(
         ...,
@@ -28,29 +28,21 @@ async def sign_order(
             "wallet_name": "wallet_1"
         },
     ),
-    req_wallet: WalletConfig = Depends(get_wallet),
-    current_user: UserSettings = Depends(get_current_user)
+    current_user: UserSettings = Depends(get_current_user),
+    idempotency_key: str = Header(None),
 ):
     """Sign a new order message, returning the hex data
 
     """
-    assert_wallet_has_permission(req_wallet, WalletPermission.TRADE)
-    assert_user_has_wallet_permission(current_user, signed_order.wallet_name, WalletPermission.TRADE)
+    req_wallet = await get_wallet(signed_order.wallet_name, current_user, WalletPermission.TRADE)
 
-    # create the message
-    msg = NewOrderMsg(
-        wallet=req_wallet.wallet,
-        **signed_order.msg.dict()
+    return await sign_msg(
+        current_user, req_wallet, NewOrderMsg, signed_order.msg.dict(), idempotency_key=idempotency_key
     )
 
-    log_sign_transaction(current_user, req_wallet, msg)
-
-    return {'signed_msg': msg.to_hex_data()}
-
 
-@router.post("/order/broadcast")
+@router.post("/order/broadcast", content_type=FastJSONResponse)
 async def broadcast_order(
-    background_tasks: BackgroundTasks,
     signed_order: SignOrderSchema = Body(
         ...,
         example={
@@ -65,23 +57,183 @@ async def broadcast_order(
             "wallet_name": "wallet_1"
         },
     ),
-    req_wallet: WalletConfig = Depends(get_wallet),
     current_user: UserSettings = Depends(get_current_user),
+    idempotency_key: str = Header(None),
     sync: bool = True,
+    queue: bool = False,
+    retry: bool = False,
 ):
     """Sign and broadcast a new order message to the exchange
 
+    Set queue to sign and queue the message for broadcast, returning a ticket to check its status
+
+    Set retry to sign and broadcast again if the sequence was rejected and the wallet resynced
+
+    """
+    req_wallet = await get_wallet(signed_order.wallet_name, current_user, WalletPermission.TRADE)
+
+    return await broadcast_msg(
+        current_user, req_wallet, NewOrderMsg, signed_order.msg.dict(), sync=sync, queue=queue, retry=retry,
+        idempotency_key=idempotency_key
+    )
+
+
+@router.post("/order/sign/batch", content_type=FastJSONResponse)
+async def sign_order_batch(
+    signed_orders: SignOrderBatchSchema = Body(
+        ...,
+        example={
+            "msgs": [
+                {
+                    "order_type": "LIMIT",
+                    "price": 0.000396,
+                    "quantity": 10,
+                    "side": "buy",
+                    "symbol": "ANN-457_BNB",
+                    "time_in_force": "GTE"
+                },
+                {
+                    "order_type": "LIMIT",
+                    "price": 0.000397,
+                    "quantity": 10,
+                    "side": "sell",
+                    "symbol": "ANN-457_BNB",
+                    "time_in_force": "GTE"
+                }
+            ],
+            "wallet_name": "wallet_1"
+        },
+    ),
+    current_user: UserSettings = Depends(get_current_user),
+    idempotency_key: str = Header(None),
+):
+    """Sign a batch of new order messages with contiguous sequences, returning the hex data in order
+
+    """
+    req_wallet = await get_wallet(signed_orders.wallet_name, current_user, WalletPermission.TRADE)
+
+    return await sign_msgs(
+        current_user, req_wallet, NewOrderMsg, [msg.dict() for msg in signed_orders.msgs],
+        idempotency_key=idempotency_key
+    )
+
+
+@router.post("/order/broadcast/batch", content_type=FastJSONResponse)
+async def broadcast_order_batch(
+    signed_orders: SignOrderBatchSchema = Body(
+        ...,
+        example={
+            "msgs": [
+                {
+                    "order_type": "LIMIT",
+                    "price": 0.000396,
+                    "quantity": 10,
+                    "side": "buy",
+                    "symbol": "ANN-457_BNB",
+                    "time_in_force": "GTE"
+                },
+                {
+                    "order_type": "LIMIT",
+                    "price": 0.000397,
+                    "quantity": 10,
+                    "side": "sell",
+                    "symbol": "ANN-457_BNB",
+                    "time_in_force": "GTE"
+                }
+            ],
+            "wallet_name": "wallet_1"
+        },
+    ),
+    current_user: UserSettings = Depends(get_current_user),
+    idempotency_key: str = Header(None),
+    sync: bool = True,
+    retry: bool = False,
+):
+    """Sign and broadcast a batch of new order messages to the exchange
+
+    Orders are broadcast in sequence order, a result or error is returned for each order
+
+    Set retry to sign the orders not yet broadcast again if a sequence was rejected and the wallet resynced
+
+    """
+    req_wallet = await get_wallet(signed_orders.wallet_name, current_user, WalletPermission.TRADE)
+
+    return await broadcast_msgs(
+        current_user, req_wallet, NewOrderMsg, [msg.dict() for msg in signed_orders.msgs], sync=sync, retry=retry,
+        idempotency_key=idempotency_key
+    )
+
+
+@router.post("/order/ladder/sign", content_type=FastJSONResponse)
+async def sign_order_ladder(
+    ladder: SignOrderLadderSchema = Body(
+        ...,
+        example={
+            "msg": {
+                "order_type": "LIMIT",
+                "side": "buy",
+                "symbol": "ANN-457_BNB",
+                "time_in_force": "GTE",
+                "levels": [
+                    {"price": 0.000396, "quantity": 10},
+                    {"price": 0.000395, "quantity": 20},
+                    {"price": 0.000394, "quantity": 30}
+                ]
+            },
+            "wallet_name": "wallet_1"
+        },
+    ),
+    current_user: UserSettings = Depends(get_current_user),
+    idempotency_key: str = Header(None),
+):
+    """Sign a ladder of new order messages at each price level, returning the hex data in order
+
+    Each order id is derived from the account sequence, so each level is signed as its own transaction
+    with a contiguous sequence.
+
     """
-    assert_wallet_has_permission(req_wallet, WalletPermission.TRADE)
-    assert_user_has_wallet_permission(current_user, signed_order.wallet_name, WalletPermission.TRADE)
+    req_wallet = await get_wallet(ladder.wallet_name, current_user, WalletPermission.TRADE)
 
-    # create the message
-    msg = NewOrderMsg(
-        wallet=req_wallet.wallet,
-        **signed_order.msg.dict()
+    return await sign_msgs(
+        current_user, req_wallet, NewOrderMsg, [order.dict() for order in ladder.msg.orders()],
+        idempotency_key=idempotency_key
     )
 
-    log_broadcast_transaction(current_user, req_wallet, msg)
 
-    background_tasks.add_task(increment_wallet_sequence, req_wallet)
-    return await req_wallet.broadcast_msg(msg.to_hex_data(), sync=sync)
+@router.post("/order/ladder/broadcast", content_type=FastJSONResponse)
+async def broadcast_order_ladder(
+    ladder: SignOrderLadderSchema = Body(
+        ...,
+        example={
+            "msg": {
+                "order_type": "LIMIT",
+                "side": "buy",
+                "symbol": "ANN-457_BNB",
+                "time_in_force": "GTE",
+                "levels": [
+                    {"price": 0.000396, "quantity": 10},
+                    {"price": 0.000395, "quantity": 20},
+                    {"price": 0.000394, "quantity": 30}
+                ]
+            },
+            "wallet_name": "wallet_1"
+        },
+    ),
+    current_user: UserSettings = Depends(get_current_user),
+    idempotency_key: str = Header(None),
+    sync: bool = True,
+    retry: bool = False,
+):
+    """Sign and broadcast a ladder of new order messages to the exchange
+
+    Orders are broadcast in sequence order, a result or error is returned for each level
+
+    Set retry to sign the levels not yet broadcast again if a sequence was rejected and the wallet resynced
+
+    """
+    req_wallet = await get_wallet(ladder.wallet_name, current_user, WalletPermission.TRADE)
+
+    return await broadcast_msgs(
+        current_user, req_wallet, NewOrderMsg, [order.dict() for order in ladder.msg.orders()], sync=sync,
+        retry=retry, idempotency_key=idempotency_key
+    )
@@ -0,0 +1,200 @@
+import asyncio
+import inspect
+import json
+import logging
+from typing import Callable, Dict, FrozenSet, Optional, Set, Tuple, Type
+
+from fastapi import APIRouter, HTTPException
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, ValidationError
+from starlette.status import WS_1008_POLICY_VIOLATION
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+from config.config import ServiceConfig, UserSettings
+from api.endpoints import order, cancel_order, transfer, freeze, unfreeze
+from api.models.schema import (
+    SignOrderSchema, SignOrderBatchSchema, SignOrderLadderSchema, SignCancelOrderSchema, CancelOpenOrdersSchema,
+    SignTransferSchema, SignFreezeSchema
+)
+from api.security.auth import get_token_user
+from api.utils.admission import admit_request, admit_user, is_priority_path
+from api.utils.metrics import REQUEST_SECONDS, start_request_timer
+from api.utils.responses import dumps
+
+router = APIRouter()
+
+# action: (endpoint, request schema)
+STREAM_ACTIONS: Dict[str, Tuple[Callable, Type[BaseModel]]] = {
+    'order/sign': (order.sign_order, SignOrderSchema),
+    'order/broadcast': (order.broadcast_order, SignOrderSchema),
+    'order/sign/batch': (order.sign_order_batch, SignOrderBatchSchema),
+    'order/broadcast/batch': (order.broadcast_order_batch, SignOrderBatchSchema),
+    'order/ladder/sign': (order.sign_order_ladder, SignOrderLadderSchema),
+    'order/ladder/broadcast': (order.broadcast_order_ladder, SignOrderLadderSchema),
+    'order/cancel/sign': (cancel_order.sign_cancel_order, SignCancelOrderSchema),
+    'order/cancel/broadcast': (cancel_order.broadcast_cancel_order, SignCancelOrderSchema),
+    'order/cancel/all/broadcast': (cancel_order.broadcast_cancel_open_orders, CancelOpenOrdersSchema),
+    'transfer/sign': (transfer.sign_transfer, SignTransferSchema),
+    'transfer/broadcast': (transfer.broadcast_transfer, SignTransferSchema),
+    'freeze/sign': (freeze.sign_freeze, SignFreezeSchema),
+    'freeze/broadcast': (freeze.broadcast_freeze, SignFreezeSchema),
+    'unfreeze/sign': (unfreeze.sign_unfreeze, SignFreezeSchema),
+    'unfreeze/broadcast': (unfreeze.broadcast_unfreeze, SignFreezeSchema),
+}
+
+# query parameters of the http routes that may be set on a stream request
+STREAM_OPTIONS = ('sync', 'queue', 'retry', 'refresh')
+ACTION_OPTIONS: Dict[str, FrozenSet[str]] = {
+    action: frozenset(STREAM_OPTIONS) & set(inspect.signature(endpoint).parameters)
+    for action, (endpoint, _) in STREAM_ACTIONS.items()
+}
+
+
+def is_priority_action(action: Optional[str]) -> bool:
+    return action in STREAM_ACTIONS and is_priority_path(f"/api/{action}")
+
+
+class StreamSession:
+    """Handles the requests of an authenticated stream
+
+    Requests are handled concurrently, in the order they are received, and each response is sent as soon as it is
+    ready. Once the in flight limit is reached no further requests are read until one finishes.
+
+    """
+
+    def __init__(self, websocket: WebSocket, token: str, max_in_flight: int):
+        self._websocket = websocket
+        self._token = token
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._send_lock = asyncio.Lock()
+        # hold a reference to running requests until they complete
+        self._tasks: Set[asyncio.Future] = set()
+
+    async def run(self):
+        try:
+            while True:
+                text = await self._websocket.receive_text()
+                await self._in_flight.acquire()
+                task = asyncio.ensure_future(self._handle(text))
+                self._tasks.add(task)
+                task.add_done_callback(self._done)
+        except WebSocketDisconnect:
+            pass
+
+    def _done(self, task: asyncio.Future):
+        self._tasks.discard(task)
+        self._in_flight.release()
+
+    async def _handle(self, text: str):
+        request_id = None
+        action = None
+        try:
+            message = json.loads(text)
+            if not isinstance(message, dict):
+                raise HTTPException(status_code=400, detail="Expecting a json object")
+            request_id = message.get('id')
+            action = message.get('action')
+        except ValueError:
+            await self._send({'id': None, 'status': 400, 'error': "There was an error parsing the message"})
+            return
+        except HTTPException as e:
+            await self._send({'id': None, 'status': e.status_code, 'error': e.detail})
+            return
+
+        route = f"/api/stream/{action}" if action in STREAM_ACTIONS else '/api/stream'
+        timer = start_request_timer(route)
+        response = {'id': request_id, 'action': action}
+        try:
+            with admit_request(priority=is_priority_action(action)):
+                response.update(status=200, result=jsonable_encoder(await self._call(action, message)))
+        except HTTPException as e:
+            response.update(status=e.status_code, error=e.detail)
+        except ValidationError as e:
+            response.update(status=422, error=e.errors())
+        except Exception as e:
+            logging.exception(f"Stream request {action} failed")
+            response.update(status=500, error=str(e))
+        REQUEST_SECONDS.labels('WS', route, response['status']).observe(timer.elapsed())
+
+        await self._send(response)
+
+    async def _call(self, action: Optional[str], message: Dict):
+        # tokens are checked on each request so expired tokens and config changes apply to open streams
+        user: UserSettings = get_token_user(self._token)
+
+        if action not in STREAM_ACTIONS:
+            raise HTTPException(status_code=404, detail=f"Unknown action {action}")
+        endpoint, schema = STREAM_ACTIONS[action]
+        admit_user(user, priority=is_priority_action(action))
+
+        options = {name: message[name] for name in STREAM_OPTIONS if name in message}
+        invalid = [name for name, value in options.items() if not isinstance(value, bool)]
+        if invalid:
+            raise HTTPException(status_code=400, detail=f"Expecting {', '.join(sorted(invalid))} to be true or false")
+        unsupported = set(options) - ACTION_OPTIONS[action]
+        if unsupported:
+            raise HTTPException(status_code=400, detail=f"Unsupported options {', '.join(sorted(unsupported))}")
+
+        data = message.get('data', {})
+        if not isinstance(data, dict):
+            raise HTTPException(status_code=400, detail="Expecting data to be a json object")
+
+        idempotency_key = message.get('idempotency_key')
+        if idempotency_key is not None and not isinstance(idempotency_key, str):
+            raise HTTPException(status_code=400, detail="Expecting idempotency_key to be a string")
+
+        return await endpoint(schema(**data), user, idempotency_key=idempotency_key, **options)
+
+    async def _send(self, response: Dict):
+        try:
+            async with self._send_lock:
+                await self._websocket.send_text(dumps(response).decode())
+        except Exception:
+            # the client has gone, the request itself has completed
+            logging.warning(f"Unable to send stream response {response.get('id')}")
+
+
+def get_bearer_token(websocket: WebSocket) -> Optional[str]:
+    scheme, _, token = websocket.headers.get('authorization', '').partition(' ')
+    if scheme.lower() == 'bearer' and token:
+        return token
+    return None
+
+
+@router.websocket_route("/stream")
+async def stream(websocket: WebSocket):
+    """Stream sign and broadcast requests over a websocket
+
+    Authenticate with an `Authorization: Bearer <token>` header, or send `{"action": "auth", "token": "<token>"}`
+    as the first message. Then send requests as
+
+        {"id": "<correlation id>", "action": "order/broadcast", "data": {<request body>}, "sync": true,
+         "idempotency_key": "<optional key>"}
+
+    responses are sent as they complete with the correlation id, a status and either the result or error.
+
+    """
+    await websocket.accept()
+
+    try:
+        token = get_bearer_token(websocket)
+        if not token:
+            try:
+                message = json.loads(await websocket.receive_text())
+            except ValueError:
+                message = None
+            if not isinstance(message, dict) or message.get('action') != 'auth' or not message.get('token'):
+                raise HTTPException(status_code=401, detail="Expecting an auth message with a token")
+            token = message['token']
+        user = get_token_user(token)
+    except WebSocketDisconnect:
+        return
+    except HTTPException as e:
+        await websocket.send_json({'action': 'auth', 'status': e.status_code, 'error': e.detail})
+        await websocket.close(code=WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.send_json({'action': 'auth', 'status': 200, 'result': {'username': user.username}})
+
+    session = StreamSession(websocket, token, ServiceConfig().settings.stream_max_in_flight)
+    await session.run()
@@ -1,18 +1,18 @@
-from fastapi import APIRouter, Depends, BackgroundTasks, Body
+from fastapi import APIRouter, Depends, Body, Header
 
 from binance_chain.messages import TransferMsg
 
-from config.config import WalletConfig, UserSettings
+from config.config import UserSettings
 from api.models.schema import SignTransferSchema
 from api.constants.constants import WalletPermission
-from api.utils.wallet import get_wallet, increment_wallet_sequence
-from api.security.auth import get_current_user, assert_user_has_wallet_permission, assert_wallet_has_permission
-from api.utils.logging import log_broadcast_transaction, log_sign_transaction
+from api.utils.responses import FastJSONResponse
+from api.utils.wallet import get_wallet, sign_msg, broadcast_msg
+from api.security.auth import get_current_user
 
 router = APIRouter()
 
 
-@router.post("/transfer/sign")
+@router.post("/transfer/sign", content_type=FastJSONResponse)
 async def sign_transfer(
     transfer: SignTransferSchema = Body(
         ...,
@@ -26,29 +26,19 @@ async def sign_transfer(
             "memo": "Thanks for the beer"
         }
     ),
-    req_wallet: WalletConfig = Depends(get_wallet),
-    current_user: UserSettings = Depends(get_current_user)
+    current_user: UserSettings = Depends(get_current_user),
+    idempotency_key: str = Header(None),
 ):
     """Sign a transfer message, returning the hex data
 
     """
-    assert_wallet_has_permission(req_wallet, WalletPermission.TRANSFER)
-    assert_user_has_wallet_permission(current_user, transfer.wallet_name, WalletPermission.TRANSFER)
-
-    # create the message
-    msg = TransferMsg(
-        wallet=req_wallet.wallet,
-        **transfer.msg.dict()
-    )
-
-    log_sign_transaction(current_user, req_wallet, msg)
+    req_wallet = await get_wallet(transfer.wallet_name, current_user, WalletPermission.TRANSFER)
 
-    return {'signed_msg': msg.to_hex_data()}
+    return await sign_msg(current_user, req_wallet, TransferMsg, transfer.msg.dict(), idempotency_key=idempotency_key)
 
 
-@router.post("/transfer/broadcast")
+@router.post("/transfer/broadcast", content_type=FastJSONResponse)
 async def broadcast_transfer(
-    background_tasks: BackgroundTasks,
     transfer: SignTransferSchema = Body(
         ...,
         example={
@@ -60,23 +50,22 @@ async def broadcast_transfer(
             "wallet_name": "wallet_1"
         }
     ),
-    req_wallet: WalletConfig = Depends(get_wallet),
     current_user: UserSettings = Depends(get_current_user),
+    idempotency_key: str = Header(None),
     sync: bool = True,
+    queue: bool = False,
+    retry: bool = False,
 ):
     """Sign and broadcast a transfer message to the exchange
 
-    """
-    assert_wallet_has_permission(req_wallet, WalletPermission.TRANSFER)
-    assert_user_has_wallet_permission(current_user, transfer.wallet_name, WalletPermission.TRANSFER)
+    Set queue to sign and queue the message for broadcast, returning a ticket to check its status
 
-    # create the message
-    msg = TransferMsg(
-        wallet=req_wallet.wallet,
-        **transfer.msg.dict()
-    )
+    Set retry to sign and broadcast again if the sequence was rejected and the wallet resynced
 
-    log_broadcast_transaction(current_user, req_wallet, msg)
+    """
+    req_wallet = await get_wallet(transfer.wallet_name, current_user, WalletPermission.TRANSFER)
 
-    background_tasks.add_task(increment_wallet_sequence, req_wallet)
-    return await req_wallet.broadcast_msg(msg.to_hex_data(), sync=sync)
+    return await broadcast_msg(
+        current_user, req_wallet, TransferMsg, transfer.msg.dict(), sync=sync, queue=queue, retry=retry,
+        idempotency_key=idempotency_key
+    )
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends, HTTPException, Path
+
+from config.config import ServiceConfig, UserSettings
+from api.security.auth import get_current_user
+from api.utils.responses import FastJSONResponse
+
+router = APIRouter()
+
+
+@router.get("/tx/{tx_hash}", content_type=FastJSONResponse)
+async def tx_status(
+    tx_hash: str = Path(..., title="Hash of a tx broadcast by the service"),
+    wait: float = 0,
+    current_user: UserSettings = Depends(get_current_user)
+):
+    """Get the confirmation status of a tx broadcast by the service
+
+    Set wait to the seconds to wait for a pending tx to be committed, failed or expired before returning its status
+
+    """
+    config = ServiceConfig()
+
+    record = config.get_tx_record(tx_hash)
+    if not record or not current_user.get_wallet_permissions(record.wallet_name):
+        raise HTTPException(status_code=404, detail=f"Tx {tx_hash} not found")
+
+    if wait > 0 and not record.done:
+        await record.wait(min(wait, config.settings.tx_confirmation_timeout_seconds))
+
+    return record.asdict()
@@ -1,55 +1,63 @@
-from fastapi import APIRouter, Depends, Path
+from fastapi import APIRouter, Depends, Header, Path
 
 
-from config.config import WalletConfig, UserSettings
-from api.utils.wallet import get_wallet
+from config.config import UserSettings
+from api.utils.responses import FastJSONResponse
+from api.utils.wallet import get_wallet, get_wallet_info_json
 from api.models.schema import WalletSchema
 from api.constants.constants import WalletPermission
-from api.security.auth import get_current_user, assert_user_has_wallet_permission, assert_wallet_has_permission
+from api.security.auth import get_current_user
 
 router = APIRouter()
 
 
-@router.post("/wallet/resync")
+@router.post("/wallet/resync", content_type=FastJSONResponse)
 async def wallet_resync(
     wallet_req: WalletSchema,
-    req_wallet: WalletConfig = Depends(get_wallet),
     current_user: UserSettings = Depends(get_current_user)
 ):
     """Resynchronise the wallet to the chain
 
-    Needed if the sequence of the wallet gets out of sync
+    Needed if the sequence of the wallet gets out of sync, resets the wallet to the sequence on the chain and forgets
+    any sequences still reserved
 
     """
-    assert_wallet_has_permission(req_wallet, WalletPermission.RESYNC)
-    assert_user_has_wallet_permission(current_user, wallet_req.wallet_name, WalletPermission.RESYNC)
+    req_wallet = await get_wallet(wallet_req.wallet_name, current_user, WalletPermission.RESYNC)
 
-    req_wallet.wallet.reload_account_sequence()
+    await req_wallet.reload_sequence(reset=True)
 
     return {}
 
 
 @router.get("/wallet")
 async def all_wallet_details(
-    current_user: UserSettings = Depends(get_current_user)
+    current_user: UserSettings = Depends(get_current_user),
+    if_none_match: str = Header(None),
 ):
-    """Get detail info for all wallets the authenticated user can access"""
+    """Get detail info for all wallets the authenticated user can access
+
+    Returns an ETag, send it as If-None-Match to get 304 Not Modified until the config changes
 
-    w_info = current_user.get_wallet_info()
+    """
 
-    return w_info
+    return (await get_wallet_info_json(current_user)).response(if_none_match)
 
 
 @router.get("/wallet/{wallet_name}")
 async def wallet_detail(
     wallet_name: str = Path(..., title="Name of wallet"),
-    current_user: UserSettings = Depends(get_current_user)
+    current_user: UserSettings = Depends(get_current_user),
+    if_none_match: str = Header(None),
 ):
-    """Get detail info for the specified wallet"""
+    """Get detail info for the specified wallet
+
+    Returns an ETag, send it as If-None-Match to get 304 Not Modified until the config changes
+
+    """
 
-    w_info = current_user.get_wallet_info(wallet_name)
+    w_info = await get_wallet_info_json(current_user, wallet_name)
 
     if not w_info:
         return {"detail": f"Not authorised to access wallet {wallet_name}"}
 
-    return w_info[0]
+    return w_info.response(if_none_match)
@@ -1,10 +1,22 @@
 from decimal import Decimal
-from typing import Optional
+from typing import List, Optional
 
-from pydantic import BaseModel, Schema
+from pydantic import BaseModel, Schema, validator
 
 from binance_chain.constants import TimeInForce, OrderSide, OrderType
 
+from config.config import ServiceConfig
+
+
+def _check_batch_size(value: List, name: str) -> List:
+    """Reject empty batches and batches over the max_batch_msgs setting"""
+    if not value:
+        raise ValueError(f'at least one {name} must be included')
+    max_msgs = ServiceConfig().settings.max_batch_msgs
+    if len(value) > max_msgs:
+        raise ValueError(f'at most {max_msgs} {name}s may be included')
+    return value
+
 
 class OrderSchema(BaseModel):
     symbol: str = Schema(..., description="Trading pair full name")
@@ -24,6 +36,54 @@ class SignOrderSchema(BaseModel):
     wallet_name: str = Schema(..., title="Wallet name", description="Name of wallet to sign msg with")
 
 
+class SignOrderBatchSchema(BaseModel):
+    msgs: List[OrderSchema] = Schema(..., title="Orders", description="Orders to sign in sequence order")
+    wallet_name: str = Schema(..., title="Wallet name", description="Name of wallet to sign msgs with")
+
+    @validator('msgs', whole=True)
+    def msgs_size(cls, value):  # noqa
+        return _check_batch_size(value, 'order')
+
+
+class OrderLadderLevelSchema(BaseModel):
+    price: Decimal = Schema(..., title="Price", description="Price to place order", gt=0)
+    quantity: Decimal = Schema(..., title="Quantity", description="Quantity of the order", gt=0)
+
+
+class OrderLadderSchema(BaseModel):
+    symbol: str = Schema(..., description="Trading pair full name")
+    time_in_force: TimeInForce = Schema(
+        ...,
+        title="Time in force",
+        description="GTE (Good till expire) or IOC (Immediate or Cancel)"
+    )
+    order_type: OrderType = Schema(..., title="Order type", description="LIMIT is the only valid order type")
+    side: OrderSide = Schema(..., title="Order side", description="buy or sell")
+    levels: List[OrderLadderLevelSchema] = Schema(..., title="Levels", description="Price and quantity of each order")
+
+    @validator('levels', whole=True)
+    def levels_size(cls, value):  # noqa
+        return _check_batch_size(value, 'level')
+
+    def orders(self) -> List[OrderSchema]:
+        return [
+            OrderSchema(
+                symbol=self.symbol,
+                time_in_force=self.time_in_force,
+                order_type=self.order_type,
+                side=self.side,
+                price=level.price,
+                quantity=level.quantity
+            )
+            for level in self.levels
+        ]
+
+
+class SignOrderLadderSchema(BaseModel):
+    msg: OrderLadderSchema
+    wallet_name: str = Schema(..., title="Wallet name", description="Name of wallet to sign msgs with")
+
+
 class CancelOrderSchema(BaseModel):
     symbol: str = Schema(..., description="Trading pair full name")
     order_id: str = Schema(..., title="Order id")
@@ -34,6 +94,11 @@ class SignCancelOrderSchema(BaseModel):
     wallet_name: str = Schema(..., title="Wallet name", description="Name of wallet to sign msg with")
 
 
+class CancelOpenOrdersSchema(BaseModel):
+    wallet_name: str = Schema(..., title="Wallet name", description="Name of wallet to cancel the orders of")
+    symbol: Optional[str] = Schema(None, description="Trading pair to cancel the orders of, all pairs if not set")
+
+
 class TransferSchema(BaseModel):
     to_address: str = Schema(..., title="Address to transfer tokens to")
     amount: Decimal = Schema(..., title="Amount to transfer", gt=0)
@@ -52,7 +117,7 @@ class FreezeSchema(BaseModel):
 
 
 class SignFreezeSchema(BaseModel):
-    msg: TransferSchema
+    msg: FreezeSchema
     wallet_name: str = Schema(..., title="Wallet name", description="Name of wallet to sign msg with")
 
 
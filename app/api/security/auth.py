@@ -1,4 +1,6 @@
+import asyncio
 import logging
+from concurrent.futures import ProcessPoolExecutor
 from typing import Optional
 
 from passlib.context import CryptContext
@@ -7,9 +9,13 @@ from jwt import PyJWTError
 
 from fastapi import HTTPException, Security
 from fastapi.security import OAuth2PasswordBearer
-from starlette.status import HTTP_403_FORBIDDEN
+from starlette.requests import Request
+from starlette.status import HTTP_403_FORBIDDEN, HTTP_429_TOO_MANY_REQUESTS
 
+from api.utils.admission import admit_user, is_priority_path
+from api.utils.cache import LRUCache
 from api.utils.jwt import ALGORITHM
+from api.utils.metrics import PERMISSION_DENIED_TOTAL, mark_stage
 from api.models.token import TokenPayload
 
 from config.config import ServiceConfig, UserSettings, WalletConfig
@@ -18,36 +24,100 @@ from api.constants.constants import WalletPermission
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 reusable_oauth2 = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+_token_cache: Optional[LRUCache] = None
+_token_cache_version: Optional[int] = None
 
-def user_authenticate(username: str, password: str) -> Optional[UserSettings]:
-    config = ServiceConfig()
 
-    for user in config.users:
-        if user.username != username:
-            continue
+class PasswordVerifier:
+    """Verifies password hashes in a dedicated process pool
 
-        if not verify_password(password, user.password_hash.get_secret_value()):
-            continue
+    Keeps bcrypt off the event loop and the request threadpool. Once the workers are busy and the queue is full
+    further verifications are rejected with a 429.
 
-        return user
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+        self._limit = workers + queue_size
+        self._pending = 0
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        if self._pending >= self._limit:
+            raise HTTPException(status_code=HTTP_429_TOO_MANY_REQUESTS, detail="Too many login requests")
+
+        self._pending += 1
+        try:
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(self._executor, verify_password, plain_password, hashed_password)
+        finally:
+            self._pending -= 1
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+_password_verifier: Optional[PasswordVerifier] = None
+
+
+def get_password_verifier() -> PasswordVerifier:
+    global _password_verifier
+    if not _password_verifier:
+        settings = ServiceConfig().settings
+        _password_verifier = PasswordVerifier(workers=settings.login_workers, queue_size=settings.login_queue_size)
+    return _password_verifier
+
+
+def shutdown_password_verifier():
+    global _password_verifier
+    if _password_verifier:
+        _password_verifier.shutdown()
+        _password_verifier = None
 
-    return None
+
+async def user_authenticate(username: str, password: str) -> Optional[UserSettings]:
+    user = get_user_by_username(username)
+    if not user:
+        return None
+
+    if not await get_password_verifier().verify(password, user.password_hash.get_secret_value()):
+        return None
+
+    return user
 
 
 def get_user_by_username(username: str) -> Optional[UserSettings]:
     config = ServiceConfig()
 
-    for user in config.users:
-        if user.username != username:
-            continue
+    return config.get_user(username)
 
-        return user
 
-    return None
+def get_token_cache() -> LRUCache:
+    """Cache of verified tokens to their user, replaced when the config is reloaded"""
+    global _token_cache, _token_cache_version
+    config = ServiceConfig()
+    if _token_cache is None or _token_cache_version != config.version:
+        _token_cache = LRUCache(maxsize=config.settings.token_cache_size)
+        _token_cache_version = config.version
+    return _token_cache
+
+
+def get_current_user(request: Request, token: str = Security(reusable_oauth2)) -> Optional[UserSettings]:
+    # the request body has been read and parsed by the time dependencies are solved
+    mark_stage('parse')
+    user = get_token_user(token)
+    admit_user(user, priority=is_priority_path(request.url.path))
+    mark_stage('auth')
+    return user
 
 
-def get_current_user(token: str = Security(reusable_oauth2)) -> Optional[UserSettings]:
+def get_token_user(token: str) -> Optional[UserSettings]:
     config = ServiceConfig()
+    token_cache = get_token_cache()
+
+    user = token_cache.get(token)
+    if user:
+        return user
+
     try:
         payload = jwt.decode(token, config.settings.secret_key.get_secret_value(), algorithms=[ALGORITHM])
         token_data = TokenPayload(**payload)
@@ -59,11 +129,15 @@ def get_current_user(token: str = Security(reusable_oauth2)) -> Optional[UserSet
     user = get_user_by_username(username=token_data.username)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+
+    # cache until the token expires
+    token_cache.set(token, user, expires=payload.get('exp'))
     return user
 
 
 def assert_user_has_wallet_permission(user: UserSettings, wallet_name: str, permission: WalletPermission):
     if not user.has_wallet_permission(wallet_name, permission):
+        PERMISSION_DENIED_TOTAL.labels(wallet_name, permission.value).inc()
         raise HTTPException(
             status_code=403,
             detail=f"User has no permission {permission} on wallet {wallet_name}"
@@ -72,6 +146,7 @@ def assert_user_has_wallet_permission(user: UserSettings, wallet_name: str, perm
 
 def assert_wallet_has_permission(wallet: WalletConfig, permission: WalletPermission):
     if not wallet.has_permission(permission):
+        PERMISSION_DENIED_TOTAL.labels(wallet.name, permission.value).inc()
         raise HTTPException(status_code=403, detail=f"No permission {permission}")
 
 
@@ -0,0 +1,128 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+from starlette.status import HTTP_429_TOO_MANY_REQUESTS
+
+from config.config import RateLimitSettings, ServiceConfig, UserSettings, WalletConfig
+from api.utils.metrics import REQUESTS_IN_FLIGHT, REQUESTS_REJECTED_TOTAL
+
+# cancels take resting orders off the book, so they are still admitted when the service is busy
+PRIORITY_PATHS = ('/api/order/cancel/',)
+# tx status requests may wait on a confirmation without doing any work, so they aren't counted in flight
+UNCOUNTED_PATHS = ('/api/tx/',)
+
+_user_buckets: Dict[str, Optional['TokenBucket']] = {}
+_wallet_buckets: Dict[str, Optional['TokenBucket']] = {}
+_buckets_version: Optional[int] = None
+_in_flight = 0
+
+
+class TokenBucket:
+    """Thread safe token bucket refilled at a rate of tokens per second up to the burst size
+
+    Tokens below the cancel reserve may only be taken by priority requests
+
+    """
+
+    def __init__(self, rate: float, burst: float, cancel_reserve: float = 0):
+        self._rate = rate
+        self._burst = burst
+        self._reserve = min(cancel_reserve, burst - 1)
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings: Optional[RateLimitSettings]) -> Optional['TokenBucket']:
+        if not settings:
+            return None
+        return cls(settings.rate, settings.burst, settings.cancel_reserve)
+
+    def acquire(self, priority: bool = False) -> float:
+        """Take a token, returning 0 if taken or else the seconds until one is available"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+
+            required = 1 if priority else 1 + self._reserve
+            if self._tokens >= required:
+                self._tokens -= 1
+                return 0
+            return (required - self._tokens) / self._rate
+
+
+def is_priority_path(path: str) -> bool:
+    return path.startswith(PRIORITY_PATHS)
+
+
+def is_counted_path(path: str) -> bool:
+    return path.startswith('/api/') and not path.startswith(UNCOUNTED_PATHS)
+
+
+def _get_buckets():
+    """Buckets of users and wallets, replaced when the config is reloaded"""
+    global _user_buckets, _wallet_buckets, _buckets_version
+    config = ServiceConfig()
+    if _buckets_version != config.version:
+        _user_buckets, _wallet_buckets = {}, {}
+        _buckets_version = config.version
+    return config, _user_buckets, _wallet_buckets
+
+
+def _acquire(bucket: Optional[TokenBucket], priority: bool, reason: str, detail: str):
+    if not bucket:
+        return
+    wait = bucket.acquire(priority)
+    if wait:
+        REQUESTS_REJECTED_TOTAL.labels(reason).inc()
+        raise HTTPException(status_code=HTTP_429_TOO_MANY_REQUESTS, detail=f"{detail}, retry in {wait:.2f}s")
+
+
+def admit_user(user: UserSettings, priority: bool = False):
+    """Take a request from the rate limit of the user, raising a 429 if it is exhausted"""
+    config, user_buckets, _ = _get_buckets()
+    try:
+        bucket = user_buckets[user.username]
+    except KeyError:
+        bucket = user_buckets.setdefault(
+            user.username, TokenBucket.from_settings(user.rate_limit or config.settings.user_rate_limit)
+        )
+    _acquire(bucket, priority, 'user_rate_limit', f"Rate limit exceeded for user {user.username}")
+
+
+def admit_wallet(wallet: WalletConfig, priority: bool = False):
+    """Take a request from the rate limit of the wallet, raising a 429 if it is exhausted"""
+    config, _, wallet_buckets = _get_buckets()
+    try:
+        bucket = wallet_buckets[wallet.name]
+    except KeyError:
+        bucket = wallet_buckets.setdefault(
+            wallet.name, TokenBucket.from_settings(wallet.rate_limit or config.settings.wallet_rate_limit)
+        )
+    _acquire(bucket, priority, 'wallet_rate_limit', f"Rate limit exceeded for wallet {wallet.name}")
+
+
+@contextmanager
+def admit_request(priority: bool = False):
+    """Count a request in flight for the block
+
+    Once max_in_flight_requests are in flight further requests are rejected with a 429, unless they are a priority
+
+    """
+    global _in_flight
+    limit = ServiceConfig().settings.max_in_flight_requests
+    if limit and not priority and _in_flight >= limit:
+        REQUESTS_REJECTED_TOTAL.labels('overloaded').inc()
+        raise HTTPException(status_code=HTTP_429_TOO_MANY_REQUESTS, detail="Service is overloaded, retry shortly")
+
+    _in_flight += 1
+    REQUESTS_IN_FLIGHT.inc()
+    try:
+        yield
+    finally:
+        _in_flight -= 1
+        REQUESTS_IN_FLIGHT.dec()
@@ -0,0 +1,290 @@
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from fastapi import HTTPException
+from starlette.status import HTTP_409_CONFLICT, HTTP_422_UNPROCESSABLE_ENTITY
+
+from config.config import ServiceConfig, UserSettings, WalletConfig
+from config.sequence import get_store_executor, process_alive
+from api.utils.cache import LRUCache
+from api.utils.metrics import IDEMPOTENT_REPLAYS_TOTAL
+from api.utils.responses import dumps
+
+# seconds between removals of expired keys from a shared store
+SWEEP_INTERVAL_SECONDS = 60
+
+
+class SharedIdempotencyStore:
+    """Idempotency keys in files shared by the worker processes of a host
+
+    A request claims its key by writing the file of the key while holding a lock on the store, so only one worker
+    runs it and the others find it in flight or find its result. Claims of workers that have exited are taken over.
+    Keep the directory on a memory backed filesystem such as /dev/shm.
+
+    Operations may wait on the lock of another process, run them off the event loop.
+
+    """
+
+    def __init__(self, path: str, ttl: float):
+        if fcntl is None:
+            raise Exception("A shared idempotency store requires fcntl file locks")
+        self._path = path
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._lock_file = None
+        self._lock_pid: Optional[int] = None
+        self._swept = 0.0
+        os.makedirs(path, exist_ok=True)
+
+    def _get_lock_file(self):
+        # file locks are shared with forked children through the open file, so each process opens its own
+        if self._lock_pid != os.getpid():
+            self._lock_file = open(os.path.join(self._path, '.lock'), 'a')
+            self._lock_pid = os.getpid()
+        return self._lock_file
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            lock_file = self._get_lock_file()
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _key_path(self, username: str, key: str) -> str:
+        name = hashlib.sha256(f"{username}\0{key}".encode()).hexdigest()
+        return os.path.join(self._path, f"{name}.json")
+
+    @staticmethod
+    def _read(path: str) -> Optional[Dict]:
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    @staticmethod
+    def _write(path: str, entry: Dict):
+        # replace the file so a reader never sees a partial write
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _is_live(entry: Dict, now: float) -> bool:
+        if entry['expires'] <= now:
+            return False
+        return 'result' in entry or process_alive(entry['pid'])
+
+    def claim(self, username: str, key: str, fingerprint: str) -> Optional[Dict]:
+        """Claim a key for a request of this process, returning the entry of the key if another request holds it
+
+        The entry has the fingerprint of the request holding the key and its json result, or no result while it
+        is still running
+
+        """
+        path = self._key_path(username, key)
+        now = time.time()
+        with self._locked():
+            self._sweep(now)
+            entry = self._read(path)
+            if entry and self._is_live(entry, now):
+                return entry
+            self._write(path, {'fingerprint': fingerprint, 'pid': os.getpid(), 'expires': now + self._ttl})
+        return None
+
+    def save(self, username: str, key: str, fingerprint: str, result: Any):
+        entry = {'fingerprint': fingerprint, 'result': dumps(result).decode(), 'expires': time.time() + self._ttl}
+        with self._locked():
+            self._write(self._key_path(username, key), entry)
+
+    def release(self, username: str, key: str):
+        """Give up the claim of a request that failed so it may be retried"""
+        path = self._key_path(username, key)
+        with self._locked():
+            entry = self._read(path)
+            if entry and 'result' not in entry and entry['pid'] == os.getpid():
+                os.remove(path)
+
+    def _sweep(self, now: float):
+        if now - self._swept < SWEEP_INTERVAL_SECONDS:
+            return
+        self._swept = now
+        for name in os.listdir(self._path):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self._path, name)
+            entry = self._read(path)
+            if entry is None or not self._is_live(entry, now):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+class IdempotencyCache:
+    """Results of sign and broadcast requests by user and idempotency key
+
+    The first request with a key runs, retries with the same key wait for it if it is still running, then get its
+    result without signing again. Only successful results are kept, so a failed request may be retried. If the
+    first request is cancelled before it finishes, the retry runs it.
+
+    With a shared store the keys are also claimed across worker processes. A retry handled by another worker than
+    the first request gets its result once it has finished, or a 409 while it is still running.
+
+    """
+
+    def __init__(self, maxsize: int, ttl: float, store: Optional[SharedIdempotencyStore] = None):
+        self._results = LRUCache(maxsize=maxsize)
+        self._ttl = ttl
+        self._store = store
+        self._in_flight: Dict[Tuple[str, str], Tuple[str, asyncio.Future]] = {}
+
+    async def run(self, username: str, key: str, fingerprint: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        cache_key = (username, key)
+        while True:
+            entry = self._results.get(cache_key) or self._in_flight.get(cache_key)
+            if not entry:
+                break
+            entry_fingerprint, result = entry
+            _check_fingerprint(key, fingerprint, entry_fingerprint)
+            if not isinstance(result, asyncio.Future):
+                return result
+            try:
+                return await asyncio.shield(result)
+            except asyncio.CancelledError:
+                if not result.cancelled():
+                    raise
+                # the request running it was cancelled, so it may not have signed, run it again
+
+        future = asyncio.get_event_loop().create_future()
+        self._in_flight[cache_key] = (fingerprint, future)
+        claimed = False
+        try:
+            if self._store:
+                shared = await self._run_store(self._store.claim, username, key, fingerprint)
+                if shared:
+                    result = _shared_result(key, fingerprint, shared)
+                else:
+                    claimed = True
+                    result = await call()
+            else:
+                result = await call()
+        except asyncio.CancelledError:
+            future.cancel()
+            if claimed:
+                self._release(username, key)
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # retrieve it so an exception no retry waited on isn't logged
+            future.exception()
+            if claimed:
+                self._release(username, key)
+            raise
+        finally:
+            if self._in_flight.get(cache_key, (None, None))[1] is future:
+                del self._in_flight[cache_key]
+
+        future.set_result(result)
+        self._results.set(cache_key, (fingerprint, result), expires=time.time() + self._ttl)
+        if claimed:
+            # saved even if the request is cancelled now, or retries in other workers would find it running
+            await asyncio.shield(self._run_store(self._store.save, username, key, fingerprint, result))
+        return result
+
+    @staticmethod
+    async def _run_store(operation: Callable, *args) -> Any:
+        return await asyncio.get_event_loop().run_in_executor(get_store_executor(), operation, *args)
+
+    def _release(self, username: str, key: str):
+        # may be called while the request is cancelled, so it isn't awaited
+        asyncio.get_event_loop().run_in_executor(get_store_executor(), self._store.release, username, key)
+
+
+def _check_fingerprint(key: str, fingerprint: str, entry_fingerprint: str):
+    if entry_fingerprint != fingerprint:
+        raise HTTPException(
+            status_code=HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Idempotency key {key} was used for a different request"
+        )
+
+
+def _shared_result(key: str, fingerprint: str, entry: Dict) -> Any:
+    """Result of a request with the key handled by another worker process"""
+    _check_fingerprint(key, fingerprint, entry['fingerprint'])
+    if 'result' not in entry:
+        raise HTTPException(
+            status_code=HTTP_409_CONFLICT,
+            detail=f"Request with idempotency key {key} is still running, retry shortly"
+        )
+    return json.loads(entry['result'])
+
+
+_idempotency_cache: Optional[IdempotencyCache] = None
+
+
+def get_idempotency_cache() -> IdempotencyCache:
+    """Cache of idempotent results, kept when the config is reloaded so retries across a reload still match"""
+    global _idempotency_cache
+    if not _idempotency_cache:
+        settings = ServiceConfig().settings
+        store = None
+        if settings.sequence_store_dir:
+            # worker processes share the wallets, so a retry may reach another worker than the first request
+            store = SharedIdempotencyStore(
+                os.path.join(settings.sequence_store_dir, 'idempotency'), ttl=settings.idempotency_ttl_seconds
+            )
+        _idempotency_cache = IdempotencyCache(
+            maxsize=settings.idempotency_cache_size, ttl=settings.idempotency_ttl_seconds, store=store
+        )
+    return _idempotency_cache
+
+
+def request_fingerprint(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def idempotent(action: str):
+    """Run a sign or broadcast helper once per idempotency key of the user
+
+    The helper is called with the user, wallet, msg class and msg kwargs, the key is passed as idempotency_key
+
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(user: UserSettings, wallet: WalletConfig, msg_cls, msg_kwargs, *args,
+                          idempotency_key: Optional[str] = None, **kwargs):
+            if not idempotency_key:
+                return await fn(user, wallet, msg_cls, msg_kwargs, *args, **kwargs)
+
+            fingerprint = request_fingerprint(action, wallet.name, msg_cls.__name__, msg_kwargs, args, kwargs)
+            cache = get_idempotency_cache()
+            called = False
+
+            async def call():
+                nonlocal called
+                called = True
+                return await fn(user, wallet, msg_cls, msg_kwargs, *args, **kwargs)
+
+            result = await cache.run(user.username, idempotency_key, fingerprint, call)
+            if not called:
+                IDEMPOTENT_REPLAYS_TOTAL.labels(action).inc()
+            return result
+        return wrapper
+    return decorator
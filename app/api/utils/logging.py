@@ -1,18 +1,164 @@
 import logging
 import json
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, List, Optional, Tuple
 
-from config.config import WalletConfig, UserSettings
+from config.config import WalletConfig, UserSettings, Settings
 from binance_chain.messages import Msg
 
+audit_logger = logging.getLogger('audit')
+audit_logger.propagate = False
+
+_listeners: List[QueueListener] = []
+# handlers of the loggers before their output was moved to a queue, put back when logging is stopped
+_original_handlers: Dict[logging.Logger, List[logging.Handler]] = {}
+_audit_listener: Optional[QueueListener] = None
+_audit_log_settings: Optional[Tuple] = None
+
+
+class MsgJson:
+    """Serialises a msg to json only when the log record is emitted"""
+
+    def __init__(self, msg: Msg):
+        self._msg = msg
+
+    def __str__(self):
+        return json.dumps(self._msg.to_dict(), default=str)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """Queue handler leaving formatting of the record to the listener thread"""
+
+    def prepare(self, record):
+        return record
+
+
+class AuditJsonFormatter(logging.Formatter):
+    """Formats audit records as a json line"""
+
+    def format(self, record):
+        msg: Msg = record.audit_msg
+        return json.dumps({
+            'time': record.created,
+            'event': record.audit_event,
+            'user': record.audit_user,
+            'wallet': record.audit_wallet,
+            'msg_type': type(msg).__name__,
+            'sequence': msg.wallet.sequence,
+            'msg': msg.to_dict(),
+        }, default=str)
+
+
+def _start_listener(logger: logging.Logger, handlers: List[logging.Handler]) -> QueueListener:
+    log_queue = queue.Queue(-1)
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+
+    _original_handlers.setdefault(logger, logger.handlers[:])
+    for handler in logger.handlers[:]:
+        logger.removeHandler(handler)
+    logger.addHandler(DeferredQueueHandler(log_queue))
+    return listener
+
+
+def _stop_listener(listener: QueueListener):
+    listener.stop()
+    originals = [handler for handlers in _original_handlers.values() for handler in handlers]
+    for handler in listener.handlers:
+        # file handlers opened here are closed, those the loggers had before are given back open
+        if isinstance(handler, logging.FileHandler) and handler not in originals:
+            handler.close()
+
+
+def _restore_handlers():
+    for logger, handlers in _original_handlers.items():
+        for handler in logger.handlers[:]:
+            logger.removeHandler(handler)
+        for handler in handlers:
+            logger.addHandler(handler)
+    _original_handlers.clear()
+
+
+def _audit_log_key(settings: Settings) -> Tuple:
+    return settings.audit_log_file, settings.audit_log_max_bytes, settings.audit_log_backup_count
 
-def log_sign_transaction(user: UserSettings, wallet: WalletConfig, msg: Msg):
 
+def _setup_audit_log(settings: Settings):
+    """Start writing to the audit log file, the previous audit log is flushed and closed"""
+    global _audit_listener, _audit_log_settings
+    previous = _audit_listener
+    _audit_listener = None
+
+    if settings.audit_log_file:
+        file_handler = RotatingFileHandler(
+            settings.audit_log_file,
+            maxBytes=settings.audit_log_max_bytes,
+            backupCount=settings.audit_log_backup_count
+        )
+        file_handler.setFormatter(AuditJsonFormatter())
+        audit_logger.setLevel(logging.INFO)
+        _audit_listener = _start_listener(audit_logger, [file_handler])
+    else:
+        audit_logger.setLevel(logging.CRITICAL)
+        for handler in audit_logger.handlers[:]:
+            audit_logger.removeHandler(handler)
+    _audit_log_settings = _audit_log_key(settings)
+
+    if previous:
+        _listeners.remove(previous)
+        _stop_listener(previous)
+
+
+def setup_logging(settings: Settings):
+    """Move log formatting and output to background threads
+
+    The handlers of the root logger are driven from a queue, and if an audit log file is configured
+    sign and broadcast events are also written to it as json lines
+
+    """
+    stop_logging()
+
+    root = logging.getLogger()
+    root.setLevel(settings.log_level)
+    _start_listener(root, root.handlers[:] or [logging.StreamHandler()])
+
+    _setup_audit_log(settings)
+
+
+def update_logging(settings: Settings):
+    """Apply the log settings of a reloaded config, the audit log is reopened if its settings changed"""
+    logging.getLogger().setLevel(settings.log_level)
+
+    if _audit_log_key(settings) != _audit_log_settings:
+        _setup_audit_log(settings)
+
+
+def stop_logging():
+    """Flush queued records, stop the background threads and give the loggers back their own handlers"""
+    global _audit_listener
+    _audit_listener = None
+    while _listeners:
+        _stop_listener(_listeners.pop())
+    _restore_handlers()
+
+
+def _log_transaction(event: str, user: UserSettings, wallet: WalletConfig, msg: Msg):
     logging.info(
-        f"User:{user.username} Wallet: {wallet.name} signed: {type(msg).__name__} with {json.dumps(msg.to_dict())}"
+        "User:%s Wallet: %s %s: %s with %s", user.username, wallet.name, event, type(msg).__name__, MsgJson(msg)
     )
 
+    if audit_logger.isEnabledFor(logging.INFO):
+        audit_logger.info(
+            event,
+            extra={'audit_event': event, 'audit_user': user.username, 'audit_wallet': wallet.name, 'audit_msg': msg}
+        )
+
+
+def log_sign_transaction(user: UserSettings, wallet: WalletConfig, msg: Msg):
+    _log_transaction('signed', user, wallet, msg)
+
 
 def log_broadcast_transaction(user: UserSettings, wallet: WalletConfig, msg: Msg):
-    logging.info(
-        f"User:{user.username} Wallet: {wallet.name} broadcast: {type(msg).__name__} with {json.dumps(msg.to_dict())}"
-    )
+    _log_transaction('broadcast', user, wallet, msg)
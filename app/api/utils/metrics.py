@@ -0,0 +1,269 @@
+import abc
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class _Metric(abc.ABC):
+    """Base of a metric family with a fixed set of label names, exposed in the Prometheus text format"""
+
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    @abc.abstractmethod
+    def _new_child(self):
+        pass
+
+    def labels(self, *values):
+        values = tuple(str(v) for v in values)
+        try:
+            return self._children[values]
+        except KeyError:
+            pass
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        with self._lock:
+            return self._children.setdefault(values, self._new_child())
+
+    @abc.abstractmethod
+    def _samples(self, values: Tuple[str, ...], child) -> List[Tuple[str, List[Tuple[str, str]], float]]:
+        pass
+
+    def render(self) -> List[str]:
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.type_name}',
+        ]
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in children:
+            for name, labels, value in self._samples(values, child):
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return lines
+
+
+class _Value:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def _samples(self, values, child):
+        return [(self.name, list(zip(self.labelnames, values)), child.value)]
+
+
+class Gauge(Counter):
+    type_name = 'gauge'
+
+    def dec(self, amount: float = 1):
+        self.labels().dec(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class _HistogramValue:
+    def __init__(self, buckets: Sequence[float]):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[idx] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _samples(self, values, child):
+        labels = list(zip(self.labelnames, values))
+        with child._lock:
+            counts = list(child.counts)
+            total = child.sum
+
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            samples.append((f'{self.name}_bucket', labels + [('le', _format_value(bound))], cumulative))
+        samples.append((f'{self.name}_count', labels, cumulative))
+        samples.append((f'{self.name}_sum', labels, total))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = Histogram(
+    'signing_service_request_seconds', 'Request latency by route', ('method', 'route', 'status')
+)
+STAGE_SECONDS = Histogram(
+    'signing_service_stage_seconds', 'Latency of each stage of handling a request', ('route', 'stage')
+)
+MSGS_TOTAL = Counter(
+    'signing_service_msgs_total', 'Msgs signed or broadcast by wallet, permission and outcome',
+    ('wallet', 'permission', 'action', 'outcome')
+)
+PERMISSION_DENIED_TOTAL = Counter(
+    'signing_service_permission_denied_total', 'Requests refused a wallet permission',
+    ('wallet', 'permission')
+)
+BROADCASTS_IN_FLIGHT = Gauge(
+    'signing_service_broadcasts_in_flight', 'Broadcasts waiting on a response from the node', ('wallet',)
+)
+SEQUENCE_RESYNCS_TOTAL = Counter(
+    'signing_service_sequence_resyncs_total', 'Wallet sequence resyncs after a sequence mismatch', ('wallet',)
+)
+IDEMPOTENT_REPLAYS_TOTAL = Counter(
+    'signing_service_idempotent_replays_total', 'Requests answered with the result of an earlier request with the '
+    'same idempotency key', ('action',)
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    'signing_service_requests_in_flight', 'Api requests being handled'
+)
+REQUESTS_REJECTED_TOTAL = Counter(
+    'signing_service_requests_rejected_total', 'Requests rejected by a rate limit or as the service is overloaded',
+    ('reason',)
+)
+TX_CONFIRMATIONS_TOTAL = Counter(
+    'signing_service_tx_confirmations_total', 'Broadcast txs by final confirmation status', ('status',)
+)
+
+_request_timer: ContextVar[Optional['RequestTimer']] = ContextVar('request_timer', default=None)
+
+
+class RequestTimer:
+    """Splits the time spent on a request into stages
+
+    Each mark records the time since the previous mark against the named stage
+
+    """
+
+    def __init__(self, route: str):
+        self.route = route
+        self.start = self._last = time.perf_counter()
+
+    def mark(self, stage: str):
+        now = time.perf_counter()
+        STAGE_SECONDS.labels(self.route, stage).observe(now - self._last)
+        self._last = now
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+
+def start_request_timer(route: str) -> RequestTimer:
+    timer = RequestTimer(route)
+    _request_timer.set(timer)
+    return timer
+
+
+def mark_stage(stage: str):
+    """Record the time since the last stage of the current request"""
+    timer = _request_timer.get()
+    if timer:
+        timer.mark(stage)
+
+
+@contextmanager
+def time_stage(stage: str):
+    """Record the time spent in a block as a stage of the current request
+
+    Outside of a request the stage is recorded against the background route
+
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        timer = _request_timer.get()
+        STAGE_SECONDS.labels(timer.route if timer else 'background', stage).observe(duration)
+        if timer:
+            timer._last = time.perf_counter()
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,63 @@
+import hashlib
+import json
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from pydantic import BaseModel
+from starlette.responses import JSONResponse, Response
+from starlette.status import HTTP_304_NOT_MODIFIED
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, bytes):
+        # keys and hashes are hex encoded bytes
+        return obj.decode()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, BaseModel):
+        return obj.dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Encode content as compact json, using orjson when installed"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_default).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response encoded with orjson when installed"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class ETaggedJSON:
+    """Rendered json body with an ETag, for responses that only change when the config is reloaded"""
+
+    def __init__(self, content: Any):
+        self.body = dumps(content)
+        self.etag = f'"{hashlib.sha256(self.body).hexdigest()[:32]}"'
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        if not if_none_match:
+            return False
+        # weak comparison, as for GET requests
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in tags or self.etag in [tag[2:] if tag.startswith('W/') else tag for tag in tags]
+
+    def response(self, if_none_match: Optional[str] = None) -> Response:
+        """The body, or 304 Not Modified if the client has the current version"""
+        headers = {'etag': self.etag, 'cache-control': 'private, no-cache'}
+        if self.matches(if_none_match):
+            return Response(status_code=HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(content=self.body, media_type='application/json', headers=headers)
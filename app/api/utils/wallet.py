@@ -1,32 +1,392 @@
+import asyncio
+import logging
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple, Type
+
+import aiohttp
 from fastapi import HTTPException
-from starlette.requests import Request
+from starlette.status import (
+    HTTP_409_CONFLICT, HTTP_429_TOO_MANY_REQUESTS, HTTP_502_BAD_GATEWAY, HTTP_503_SERVICE_UNAVAILABLE
+)
+
+from binance_chain.exceptions import BinanceChainAPIException
+from binance_chain.messages import Msg, NewOrderMsg, CancelOrderMsg, TransferMsg, FreezeMsg, UnFreezeMsg
 
-from binance_chain.wallet import Wallet
+from config.broadcast import BroadcastQueueFull
+from config.orders import OpenOrder, closed_orders
+from config.sequence import SequenceMismatch
+from config.config import ServiceConfig, WalletConfig, UserSettings
+from api.constants.constants import WalletPermission
+from api.security.auth import assert_user_has_wallet_permission, assert_wallet_has_permission
+from api.utils.admission import admit_wallet
+from api.utils.idempotency import idempotent
+from api.utils.logging import log_broadcast_transaction, log_sign_transaction
+from api.utils.metrics import MSGS_TOTAL, mark_stage
+from api.utils.responses import ETaggedJSON
 
-from config.config import ServiceConfig, WalletConfig
+_wallet_info_cache: Dict[Tuple[str, Optional[str]], Optional[ETaggedJSON]] = {}
+_wallet_info_cache_version: Optional[int] = None
 
+MSG_PERMISSIONS = {
+    NewOrderMsg: WalletPermission.TRADE,
+    CancelOrderMsg: WalletPermission.TRADE,
+    TransferMsg: WalletPermission.TRANSFER,
+    FreezeMsg: WalletPermission.FREEZE,
+    UnFreezeMsg: WalletPermission.FREEZE,
+}
 
-async def increment_wallet_sequence(wallet: Wallet):
-    wallet.increment_account_sequence()
 
+async def get_wallet(
+    wallet_name: str, user: UserSettings, permission: WalletPermission, priority: bool = False
+) -> WalletConfig:
+    """Resolve the wallet named in a validated request and take the request from its rate limit
 
-async def get_wallet(request: Request) -> WalletConfig:
-    """Checks IP restriction on wallet
+    The request is only taken from the rate limit once the wallet and user permissions are checked, so requests
+    without permission can't use up the rate limit of the wallet
 
-    :param request:
+    :param wallet_name:
+    :param user: user making the request
+    :param permission: permission the request needs on the wallet
+    :param priority: may take from the cancel reserve of the rate limit
     :return:
     """
+    mark_stage('validate')
     config = ServiceConfig()
 
-    body_json = await request.json()
-    wallet_name = body_json.get('wallet_name', None)
-    if not wallet_name:
-        raise HTTPException(status_code=400, detail="Expecting wallet_name parameter")
-
     wallet = await config.get_wallet(wallet_name, initialise=True)
+    if not wallet:
+        raise HTTPException(status_code=404, detail=f"Wallet {wallet_name} not found")
+
+    assert_wallet_has_permission(wallet, permission)
+    assert_user_has_wallet_permission(user, wallet_name, permission)
+    admit_wallet(wallet, priority=priority)
+    mark_stage('wallet')
 
     # if not wallet.ip_authorised(request.client.host):
     #     print(f'wallet not authorised from {request.client.host}')
     #     raise HTTPException(status_code=403, detail=f"Access denied {request.client.host}")
 
     return wallet
+
+
+async def get_wallet_info_json(user: UserSettings, wallet_name: Optional[str] = None) -> Optional[ETaggedJSON]:
+    """Rendered wallet info of the user, rendered once per config version
+
+    With a wallet name the info of that wallet, or None if the user has no permissions on it. Only names of
+    configured wallets are cached, so requests for arbitrary names can't grow the cache.
+
+    """
+    global _wallet_info_cache, _wallet_info_cache_version
+    config = ServiceConfig()
+    if _wallet_info_cache_version != config.version:
+        _wallet_info_cache = {}
+        _wallet_info_cache_version = config.version
+
+    if wallet_name and wallet_name not in config.wallets:
+        return None
+
+    key = (user.username, wallet_name)
+    if key not in _wallet_info_cache:
+        w_info = await user.get_wallet_info(wallet_name)
+        if wallet_name:
+            _wallet_info_cache[key] = ETaggedJSON(w_info[0]) if w_info else None
+        else:
+            _wallet_info_cache[key] = ETaggedJSON(w_info)
+    return _wallet_info_cache[key]
+
+
+@contextmanager
+def record_outcome(wallet: WalletConfig, msg_cls: Type[Msg], action: str, count: int = 1):
+    """Count msgs by wallet, permission and outcome of the block
+
+    """
+    permission = MSG_PERMISSIONS.get(msg_cls)
+    labels = (wallet.name, permission.value if permission else '', action)
+    try:
+        yield
+    except HTTPException as e:
+        MSGS_TOTAL.labels(*labels, 'rejected' if e.status_code == HTTP_429_TOO_MANY_REQUESTS else 'error').inc(count)
+        raise
+    except Exception:
+        MSGS_TOTAL.labels(*labels, 'error').inc(count)
+        raise
+    MSGS_TOTAL.labels(*labels, 'success').inc(count)
+
+
+async def create_msg(wallet: WalletConfig, msg_cls: Type[Msg], msg_kwargs: Dict) -> Msg:
+    """Create a msg using the next reserved sequence of the wallet
+
+    """
+    sequence = await wallet.reserve_sequence()
+    try:
+        return msg_cls(wallet=wallet.sequenced_wallet(sequence), **msg_kwargs)
+    except Exception:
+        await wallet.release_sequence(sequence)
+        raise
+
+
+async def create_msgs(wallet: WalletConfig, msg_cls: Type[Msg], msg_kwargs_list: List[Dict]) -> List[Msg]:
+    """Create msgs using a contiguous block of reserved sequences of the wallet
+
+    """
+    sequences = await wallet.reserve_sequences(len(msg_kwargs_list))
+    try:
+        return [
+            msg_cls(wallet=wallet.sequenced_wallet(sequence), **msg_kwargs)
+            for sequence, msg_kwargs in zip(sequences, msg_kwargs_list)
+        ]
+    except Exception:
+        for sequence in reversed(sequences):
+            await wallet.release_sequence(sequence)
+        raise
+
+
+@idempotent('sign')
+async def sign_msg(user: UserSettings, wallet: WalletConfig, msg_cls: Type[Msg], msg_kwargs: Dict) -> Dict:
+    """Create and sign a msg, returning the hex data
+
+    """
+    with record_outcome(wallet, msg_cls, 'sign'):
+        msg = await create_msg(wallet, msg_cls, msg_kwargs)
+
+        log_sign_transaction(user, wallet, msg)
+        mark_stage('build')
+
+        return {'signed_msg': await wallet.sign_msg(msg)}
+
+
+@idempotent('broadcast')
+async def broadcast_msg(user: UserSettings, wallet: WalletConfig, msg_cls: Type[Msg], msg_kwargs: Dict,
+                        sync: bool = False, queue: bool = False, retry: bool = False):
+    """Create, sign and broadcast a msg to the exchange
+
+    If queue is set the signed msg is queued for broadcast and a ticket returned straight away
+
+    If the chain rejects the sequence the wallet is resynced, and if retry is set the msg is signed and broadcast
+    once more with the new sequence. Queued msgs are broadcast after the request returns, so can't be retried.
+
+    """
+    if queue and retry:
+        raise HTTPException(status_code=400, detail="retry is not supported with queue")
+
+    with record_outcome(wallet, msg_cls, 'queue' if queue else 'broadcast'):
+        msg = await create_msg(wallet, msg_cls, msg_kwargs)
+
+        log_broadcast_transaction(user, wallet, msg)
+        mark_stage('build')
+
+        if queue:
+            try:
+                ticket = await wallet.queue_broadcast(msg, user.username, sync=sync)
+            except BroadcastQueueFull as e:
+                raise HTTPException(status_code=HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+            return ticket.asdict()
+
+        try:
+            return await wallet.broadcast_msg(msg, sync=sync)
+        except SequenceMismatch as e:
+            if not retry:
+                raise HTTPException(status_code=HTTP_409_CONFLICT, detail=str(e))
+
+        # sign again with a sequence from the resynced wallet
+        msg = await create_msg(wallet, msg_cls, msg_kwargs)
+        log_broadcast_transaction(user, wallet, msg)
+        try:
+            return await wallet.broadcast_msg(msg, sync=sync)
+        except SequenceMismatch as e:
+            raise HTTPException(status_code=HTTP_409_CONFLICT, detail=str(e))
+
+
+@idempotent('sign_batch')
+async def sign_msgs(user: UserSettings, wallet: WalletConfig, msg_cls: Type[Msg],
+                    msg_kwargs_list: List[Dict]) -> Dict:
+    """Create and sign a batch of msgs, returning the hex data in sequence order
+
+    """
+    with record_outcome(wallet, msg_cls, 'sign', count=len(msg_kwargs_list)):
+        msgs = await create_msgs(wallet, msg_cls, msg_kwargs_list)
+
+        for msg in msgs:
+            log_sign_transaction(user, wallet, msg)
+        mark_stage('build')
+
+        signed_msgs = await wallet.sign_msgs(msgs)
+
+    return {'signed_msgs': signed_msgs}
+
+
+@idempotent('broadcast_batch')
+async def broadcast_msgs(user: UserSettings, wallet: WalletConfig, msg_cls: Type[Msg], msg_kwargs_list: List[Dict],
+                         sync: bool = False, retry: bool = False) -> List[Dict]:
+    """Create, sign and broadcast a batch of msgs in sequence order
+
+    Broadcasting stops at the first failure, as later sequences would be rejected, and their sequences released.
+    If retry is set and the chain rejects a sequence, the msgs not yet broadcast are signed once more with sequences
+    of the resynced wallet.
+
+    """
+    msgs = await create_msgs(wallet, msg_cls, msg_kwargs_list)
+    mark_stage('build')
+
+    results = []
+    retried = False
+    idx = 0
+    while idx < len(msgs):
+        msg = msgs[idx]
+        log_broadcast_transaction(user, wallet, msg)
+        try:
+            with record_outcome(wallet, msg_cls, 'broadcast'):
+                results.append({'result': await wallet.broadcast_msg(msg, sync=sync)})
+        except Exception as e:
+            for skipped in reversed(msgs[idx + 1:]):
+                await wallet.release_sequence(skipped.wallet.sequence)
+            if retry and not retried and isinstance(e, SequenceMismatch):
+                retried = True
+                msgs = msgs[:idx] + await create_msgs(wallet, msg_cls, msg_kwargs_list[idx:])
+                continue
+            results.append({'error': str(e)})
+            results.extend({'error': "Not broadcast, previous msg failed"} for _ in msgs[idx + 1:])
+            break
+        idx += 1
+
+    return results
+
+
+async def create_cancel_txs(wallet: WalletConfig, orders: List[OpenOrder],
+                            msgs_per_tx: int) -> List[List[CancelOrderMsg]]:
+    """Create cancel msgs for the orders, grouped into txs of up to msgs_per_tx msgs that each take a sequence
+
+    """
+    groups = [orders[idx:idx + msgs_per_tx] for idx in range(0, len(orders), msgs_per_tx)]
+    sequences = await wallet.reserve_sequences(len(groups))
+    try:
+        txs = []
+        for sequence, group in zip(sequences, groups):
+            sequenced_wallet = wallet.sequenced_wallet(sequence)
+            txs.append([
+                CancelOrderMsg(symbol=order.symbol, order_id=order.order_id, wallet=sequenced_wallet) for order in group
+            ])
+        return txs
+    except Exception:
+        for sequence in reversed(sequences):
+            await wallet.release_sequence(sequence)
+        raise
+
+
+async def sync_open_orders(wallet: WalletConfig):
+    """Sync the open order index of the wallet with the node
+
+    Raises a 502 if the node rejects the request and a 503 if it can't be reached
+
+    """
+    try:
+        await wallet.open_orders.sync()
+    except BinanceChainAPIException as e:
+        raise HTTPException(
+            status_code=HTTP_502_BAD_GATEWAY, detail=f"Unable to list open orders of wallet {wallet.name}: {e}"
+        )
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        raise HTTPException(
+            status_code=HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Node unavailable to list open orders of wallet {wallet.name}: {str(e) or type(e).__name__}"
+        )
+
+
+def should_refresh_open_orders() -> bool:
+    """Whether open orders are synced with the node before they are used by default
+
+    Each worker process keeps its own open order index, a shared sequence store means other workers place orders too
+
+    """
+    return ServiceConfig().settings.sequence_store_dir is not None
+
+
+async def sign_txs(wallet: WalletConfig, txs: List[List[Msg]]) -> List[bytes]:
+    """Sign txs concurrently, releasing the sequences of all of them if any fails
+
+    """
+    signed = await asyncio.gather(*[wallet.sign_tx(msgs) for msgs in txs], return_exceptions=True)
+    errors = [res for res in signed if isinstance(res, BaseException)]
+    if errors:
+        for msgs in reversed(txs):
+            await wallet.release_sequence(msgs[0].wallet.sequence)
+        raise errors[0]
+    return signed
+
+
+@idempotent('cancel_all')
+async def cancel_open_orders(user: UserSettings, wallet: WalletConfig, msg_cls: Type[Msg], msg_kwargs: Dict,
+                             sync: bool = False, queue: bool = False, refresh: Optional[bool] = None) -> List[Dict]:
+    """Cancel the open orders of the wallet, or those of the symbol in msg_kwargs, in as few txs as allowed
+
+    The orders are taken from the open order index of the wallet, synced with the node first if it hasn't been yet
+    or refresh is set. Refresh defaults to on when worker processes share sequences, as the index of this process
+    misses the orders placed through the others since its last sync.
+
+    Every tx is signed before the first is broadcast, then they are broadcast back to back in sequence order, or
+    with queue set handed to the broadcast queue of the wallet and a ticket returned for each.
+
+    If the node rejects a tx as an order is no longer open, that order is dropped from the index and the rest
+    cancelled with new sequences. Any other failure stops the broadcast, as later sequences would be rejected, and
+    leaves the index as it is.
+
+    """
+    index = wallet.open_orders
+    if refresh is None:
+        refresh = should_refresh_open_orders()
+    if refresh or not index.synced:
+        try:
+            await index.sync()
+        except Exception as e:
+            # cancel the orders the index does know about
+            logging.warning(f"Unable to sync open orders of wallet {wallet.name}: {e}")
+    mark_stage('orders')
+
+    orders = index.orders(msg_kwargs.get('symbol'))
+    msgs_per_tx = ServiceConfig().settings.cancel_msgs_per_tx
+    action = 'queue' if queue else 'broadcast'
+    results = []
+    while orders:
+        txs = await create_cancel_txs(wallet, orders, msgs_per_tx)
+        for msgs in txs:
+            for msg in msgs:
+                log_broadcast_transaction(user, wallet, msg)
+        mark_stage('build')
+
+        signed = await sign_txs(wallet, txs)
+        remaining = {order.order_id: order for order in orders}
+        orders = []
+
+        for idx, (msgs, hex_data) in enumerate(zip(txs, signed)):
+            sequence = msgs[0].wallet.sequence
+            order_ids = [msg._order_id for msg in msgs]
+            try:
+                with record_outcome(wallet, msg_cls, action, count=len(msgs)):
+                    if queue:
+                        ticket = await wallet.queue_signed(hex_data, sequence, user.username, sync=sync, msgs=msgs)
+                        results.append({'order_ids': order_ids, **ticket.asdict()})
+                    else:
+                        res = await wallet.broadcast_signed(hex_data, sequence, sync=sync, msgs=msgs)
+                        results.append({'order_ids': order_ids, 'result': res})
+                continue
+            except Exception as e:
+                results.append({'order_ids': order_ids, 'error': str(e)})
+                error = e
+
+            skipped = txs[idx + 1:]
+            for tx in reversed(skipped):
+                await wallet.release_sequence(tx[0].wallet.sequence)
+            closed = closed_orders(error, msgs)
+            if closed:
+                # filled or cancelled since the index was updated, cancel the rest of the tx and those after it
+                index.apply(closed)
+                orders = [remaining[msg._order_id] for msg in msgs if msg not in closed]
+                orders.extend(remaining[msg._order_id] for tx in skipped for msg in tx)
+            else:
+                results.extend(
+                    {'order_ids': [msg._order_id for msg in tx], 'error': "Not broadcast, previous msg failed"}
+                    for tx in skipped
+                )
+            break
+
+    return results
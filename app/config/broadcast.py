@@ -0,0 +1,169 @@
+import asyncio
+import contextvars
+import logging
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from binance_chain.messages import Msg
+
+from api.constants.constants import BroadcastStatus
+
+
+class BroadcastQueueFull(Exception):
+    pass
+
+
+class BroadcastTicket:
+    """Tracks a signed msg queued for broadcast"""
+
+    def __init__(self, username: str, wallet_name: str, hex_data: bytes, sequence: int, sync: bool = False,
+                 msgs: Sequence[Msg] = ()):
+        self.id = uuid.uuid4().hex
+        self.username = username
+        self.wallet_name = wallet_name
+        self.sequence = sequence
+        self.sync = sync
+        self.created = time.time()
+        self.status = BroadcastStatus.QUEUED
+        self.result = None
+        self.error: Optional[str] = None
+        self._hex_data: Optional[bytes] = hex_data
+        self.msgs = msgs
+
+    def take_hex_data(self) -> bytes:
+        hex_data, self._hex_data = self._hex_data, None
+        return hex_data
+
+    def fail(self, error: str):
+        self.status = BroadcastStatus.FAILED
+        self.error = error
+        self._hex_data = None
+        self.msgs = ()
+
+    def asdict(self) -> Dict:
+        return {
+            'ticket': self.id,
+            'wallet_name': self.wallet_name,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+        }
+
+
+class BroadcastOrder:
+    """Holds back broadcasts of a wallet until the lower sequences reserved by this process have been sent
+
+    The node rejects txs arriving out of sequence order, so a broadcast waits until the broadcasts of lower sequences
+    complete, or their sequences are used by a sign request or released. If none of them progresses for the timeout,
+    e.g. a sequence was never returned, the broadcast goes ahead.
+
+    """
+
+    def __init__(self, timeout: float):
+        self._timeout = timeout
+        self._pending: Dict[int, asyncio.Future] = {}
+
+    def hold(self, sequences: Iterable[int]):
+        loop = asyncio.get_event_loop()
+        for sequence in sequences:
+            self._pending[sequence] = loop.create_future()
+
+    def done(self, sequence: int):
+        future = self._pending.pop(sequence, None)
+        if future and not future.done():
+            future.set_result(None)
+
+    def sent(self, sequence: int):
+        """Let go of the sequences up to one accepted by the chain, any lower are on the chain or never will be"""
+        for pending in [s for s in self._pending if s <= sequence]:
+            self.done(pending)
+
+    def clear(self):
+        for pending in list(self._pending):
+            self.done(pending)
+
+    async def wait(self, sequence: int):
+        while True:
+            earlier = [future for s, future in self._pending.items() if s < sequence]
+            if not earlier:
+                return
+            done, _ = await asyncio.wait(earlier, timeout=self._timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                return
+
+
+class BroadcastQueue:
+    """Bounded queue of signed txs for a wallet, broadcast one at a time by a background worker
+
+    The node takes one tx per broadcast and rejects txs arriving out of sequence order, so the worker sends the txs
+    waiting in the queue one after another, lowest sequence first.
+
+    Tickets taken by the worker count towards max_depth until they are broadcast or failed.
+
+    """
+
+    def __init__(self, wallet, max_depth: int):
+        self._wallet = wallet
+        self._max_depth = max_depth
+        self._queue: asyncio.Queue = asyncio.Queue()
+        # tickets taken from the queue by the worker and not finished yet
+        self._in_flight = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def full(self) -> bool:
+        return self._queue.qsize() + self._in_flight >= self._max_depth
+
+    def submit(self, ticket: BroadcastTicket):
+        if self.full():
+            raise BroadcastQueueFull(f"Broadcast queue for wallet {self._wallet.name} is full")
+        self._queue.put_nowait(ticket)
+
+        if not self._task:
+            # start the worker in a fresh context so it isn't tied to the request that submitted the first ticket
+            self._task = contextvars.Context().run(asyncio.ensure_future, self._run())
+
+    async def _run(self):
+        while True:
+            tickets = [await self._queue.get()]
+            while not self._queue.empty():
+                tickets.append(self._queue.get_nowait())
+
+            self._in_flight = len(tickets)
+            try:
+                await self._broadcast_in_order(sorted(tickets, key=lambda t: t.sequence))
+            except Exception:
+                logging.exception(f"Broadcast worker for wallet {self._wallet.name} failed")
+            finally:
+                self._in_flight = 0
+
+    async def _broadcast_in_order(self, tickets: List[BroadcastTicket]):
+        for idx, ticket in enumerate(tickets):
+            ticket.status = BroadcastStatus.BROADCASTING
+            try:
+                ticket.result = await self._wallet.broadcast_signed(
+                    ticket.take_hex_data(), ticket.sequence, sync=ticket.sync, msgs=ticket.msgs
+                )
+            except Exception as e:
+                ticket.fail(str(e))
+                # later sequences would be rejected by the chain
+                for skipped in reversed(tickets[idx + 1:]):
+                    await self._wallet.release_sequence(skipped.sequence)
+                    skipped.fail("Not broadcast, previous msg failed")
+                return
+            finally:
+                self._in_flight -= 1
+            ticket.status = BroadcastStatus.SUCCESS
+            ticket.msgs = ()
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+        pending = []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for ticket in sorted(pending, key=lambda t: t.sequence, reverse=True):
+            await self._wallet.release_sequence(ticket.sequence)
+            ticket.fail("Not broadcast, service shutting down")
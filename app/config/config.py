@@ -1,12 +1,51 @@
+import asyncio
 import logging
-from typing import Dict, List, Optional
+import os
+import threading
+from typing import Callable, Dict, FrozenSet, List, Optional, Sequence, Tuple
 from pydantic import BaseSettings, SecretStr, validator
 
 from binance_chain.environment import BinanceEnvironment
 from binance_chain.wallet import Wallet
 from binance_chain.http import AsyncHttpApiClient
+from binance_chain.messages import Msg
 
 from api.constants.constants import WalletPermission
+from api.utils.cache import LRUCache
+from api.utils.metrics import BROADCASTS_IN_FLIGHT, SEQUENCE_RESYNCS_TOTAL, time_stage
+from config.broadcast import BroadcastOrder, BroadcastQueue, BroadcastQueueFull, BroadcastTicket
+from config.confirmation import ConfirmationPoller, TxRecord
+from config.encoding import MsgEncoder
+from config.http import PooledHttpApiClient
+from config.keys import create_wallet, derive_private_keys
+from config.orders import OpenOrderIndex
+from config.sequence import (
+    SequenceAllocator, SequencedWallet, SequenceMismatch, SharedSequenceAllocator, get_store_executor,
+    is_sequence_error
+)
+from config.signing import SigningPool
+
+
+class RateLimitSettings(BaseSettings):
+    # requests per second, and requests allowed at once, 0 allows one second of requests
+    rate: float
+    burst: float = 0
+    # tokens of the bucket only cancels may take
+    cancel_reserve: float = 0
+
+    @validator('rate')
+    def rate_positive(cls, value):  # noqa
+        if value <= 0:
+            raise ValueError('rate must be positive')
+        return value
+
+    @validator('burst', always=True)
+    def burst_default(cls, value, values):  # noqa
+        if not value:
+            value = max(values.get('rate') or 0, 1)
+        if value < 1:
+            raise ValueError('burst must be at least 1')
+        return value
 
 
 class UserWalletSettings(BaseSettings):
@@ -18,27 +57,13 @@ class UserSettings(BaseSettings):
     username: str
     password_hash: SecretStr
     wallet_permissions: List[UserWalletSettings]
+    rate_limit: Optional[RateLimitSettings] = None
 
-    def get_wallet_info(self, wallet_name: Optional[str] = None):
-        config = ServiceConfig()
-        wallets = []
-        for w_name, wallet in config.wallets.items():
-            if wallet_name and w_name != wallet_name:
-                continue
-            wc: Dict = wallet.asdict()
-
-            # work out permissions
-            wc['permissions'] = list(set(wc['permissions']).intersection(set(self.get_wallet_permissions(w_name))))
-            if len(wc['permissions']):
-                wallets.append(wc)
-        return wallets
+    async def get_wallet_info(self, wallet_name: Optional[str] = None) -> List[Dict]:
+        return await ServiceConfig().get_user_wallet_info(self.username, wallet_name)
 
-    def get_wallet_permissions(self, wallet_name) -> List[WalletPermission]:
-        for wallet in self.wallet_permissions:
-            if wallet.wallet_name != wallet_name:
-                continue
-            return wallet.permissions
-        return []
+    def get_wallet_permissions(self, wallet_name) -> FrozenSet[WalletPermission]:
+        return ServiceConfig().get_user_wallet_permissions(self.username, wallet_name)
 
     def has_wallet_permission(self, wallet_name: str, permission: WalletPermission) -> bool:
         return permission in self.get_wallet_permissions(wallet_name)
@@ -49,9 +74,11 @@ class WalletSettings(BaseSettings):
     mnemonic: Optional[SecretStr] = None
     name: str
     env_name: str = 'PROD'
+    api_url: Optional[str] = None
     env: Optional[BinanceEnvironment] = None
     ip_whitelist: Optional[List[str]]
     permissions: List[WalletPermission]
+    rate_limit: Optional[RateLimitSettings] = None
 
     @validator('mnemonic', always=True)
     def mnemonic_and_private_key_dependency(cls, value, values):  # noqa
@@ -63,34 +90,213 @@ class WalletSettings(BaseSettings):
         return value
 
 
+def _secret_value(value: Optional[SecretStr]) -> Optional[str]:
+    return value.get_secret_value() if value else None
+
+
 class Settings(BaseSettings):
     wallets: List[WalletSettings]
     users: List[UserSettings]
     secret_key: SecretStr = 'secret_key'
     access_token_expiry_minutes: int = 100080
+    token_cache_size: int = 1024
+    login_workers: int = 2
+    login_queue_size: int = 64
+    signing_workers: int = 0
+    msg_template_cache_size: int = 256
+    http_connection_limit: int = 100
+    http_keepalive_timeout: float = 30
+    broadcast_queue_size: int = 100
+    broadcast_order_timeout_ms: int = 1000
+    broadcast_ticket_cache_size: int = 10000
+    broadcast_ticket_ttl_seconds: int = 3600
+    idempotency_cache_size: int = 10000
+    idempotency_ttl_seconds: int = 3600
+    stream_max_in_flight: int = 100
+    max_batch_msgs: int = 100
+    user_rate_limit: Optional[RateLimitSettings] = None
+    wallet_rate_limit: Optional[RateLimitSettings] = None
+    max_in_flight_requests: int = 0
+    tx_poll_interval_ms: int = 1000
+    tx_poll_batch_size: int = 100
+    tx_confirmation_timeout_seconds: int = 60
+    tx_status_cache_size: int = 10000
+    tx_status_ttl_seconds: int = 3600
+    open_order_sync_interval_seconds: float = 0
+    cancel_msgs_per_tx: int = 1
+    log_level: str = 'INFO'
+    audit_log_file: Optional[str] = None
+    audit_log_max_bytes: int = 100 * 1024 * 1024
+    audit_log_backup_count: int = 10
+    config_watch_interval_seconds: float = 0
+    wallet_derivation_workers: int = 0
+    lazy_wallet_derivation: bool = False
+    sequence_store_dir: Optional[str] = None
+    sequence_reservation_ttl_seconds: float = 60
+
+
+# most open orders the node lists at once
+OPEN_ORDERS_PAGE = 1000
 
 
 class WalletConfig:
-    def __init__(self, wallet_settings: WalletSettings):
+    def __init__(self, wallet_settings: WalletSettings, private_key: Optional[str] = None, lazy: bool = False):
+        """Create the wallet, deriving its key now unless lazy
 
+        :param private_key: key already derived from the mnemonic of the settings
+        :param lazy: derive the key when the wallet is first used
+
+        """
         self._settings = wallet_settings
 
         w_env = BinanceEnvironment.get_production_env()
         if wallet_settings.env_name == 'TESTNET':
             w_env = BinanceEnvironment.get_testnet_env()
+        if wallet_settings.api_url:
+            # custom node, e.g. a local node or stub
+            w_env = BinanceEnvironment(api_url=wallet_settings.api_url, wss_url=w_env.wss_url, hrp=w_env.hrp)
+        self._env = w_env
 
-        if wallet_settings.private_key:
-            log_init_type = 'private_key'
-            self._wallet = Wallet(private_key=wallet_settings.private_key.get_secret_value(), env=w_env)
-        elif wallet_settings.mnemonic:
-            log_init_type = 'mnemonic'
-            self._wallet = Wallet.create_wallet_from_mnemonic(wallet_settings.mnemonic.get_secret_value(), env=w_env)
-        else:
+        if not wallet_settings.private_key and not wallet_settings.mnemonic:
             raise Exception(f"Unable to initialise wallet {wallet_settings.name} no private_key or mnemonic set")
 
+        self._private_key = private_key
+        self._wallet: Optional[Wallet] = None
+        self._derive_lock = threading.Lock()
         self._http_client: Optional[AsyncHttpApiClient] = None
+        self._sequence = SequenceAllocator()
+        self._initialised = False
+        self._signing_pool: Optional[SigningPool] = None
+        self._encoder: Optional[MsgEncoder] = None
+        self._broadcast_queue: Optional[BroadcastQueue] = None
+        self._broadcast_order: Optional[BroadcastOrder] = None
+        self._initialise_lock: Optional[asyncio.Lock] = None
+        self._resync: Optional[asyncio.Future] = None
+        self._open_orders: Optional[OpenOrderIndex] = None
+
+        if not lazy:
+            self._derive()
+
+    def _derive(self) -> Wallet:
+        with self._derive_lock:
+            if not self._wallet:
+                private_key, mnemonic, env = self.wallet_key()
+                self._wallet = create_wallet(private_key, mnemonic, env)
+                log_init_type = 'private_key' if self._settings.private_key else 'mnemonic'
+                logging.info(f"Initialised wallet {self.name} with {log_init_type}")
+            return self._wallet
+
+    async def derive(self) -> Wallet:
+        """Wallet, deriving its key in an executor if not derived yet"""
+        if self._wallet:
+            return self._wallet
+        return await asyncio.get_event_loop().run_in_executor(None, self._derive)
+
+    def wallet_key(self) -> Tuple[Optional[str], Optional[str], BinanceEnvironment]:
+        """Private key, or the mnemonic if not derived yet, and environment to create the wallet elsewhere"""
+        if self._wallet:
+            return self._wallet.private_key, None, self._env
+        private_key = _secret_value(self._settings.private_key) or self._private_key
+        if private_key:
+            return private_key, None, self._env
+        return None, _secret_value(self._settings.mnemonic), self._env
+
+    async def initialise(self):
+        """Load the account number, sequence and chain id of the wallet
+
+        The blocking http calls of the Wallet are run in an executor, concurrent callers wait on the same load
+
+        """
+        if self.initialised:
+            return
+        if not self._initialise_lock:
+            self._initialise_lock = asyncio.Lock()
+
+        async with self._initialise_lock:
+            if self.initialised:
+                return
+            wallet = await self.derive()
+            await asyncio.get_event_loop().run_in_executor(None, wallet.initialise_wallet)
+
+            settings = ServiceConfig().settings
+            ttl = settings.sequence_reservation_ttl_seconds
+            if settings.sequence_store_dir:
+                # share sequences with the other worker processes signing for this account
+                self._sequence = SharedSequenceAllocator(
+                    os.path.join(settings.sequence_store_dir, f"{wallet.address}.json"), ttl=ttl
+                )
+            else:
+                self._sequence = SequenceAllocator(ttl=ttl)
+            await self._allocate(self._sequence.initialise, wallet.sequence)
+            self._initialised = True
+
+    async def reload_sequence(self, reset: bool = False):
+        """Reload the sequence from the chain
+
+        :param reset: forget every outstanding reservation rather than keep the live ones
+
+        """
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self.wallet.reload_account_sequence)
+        operation = self._sequence.reset if reset else self._sequence.resync
+        await self._allocate(operation, self.wallet.sequence)
+        if reset:
+            self._get_broadcast_order().clear()
+
+    async def resync_sequence(self):
+        """Reload the sequence after a sequence mismatch, concurrent callers wait on the same reload"""
+        if not self._resync:
+            self._resync = asyncio.ensure_future(self.reload_sequence())
+            self._resync.add_done_callback(self._resync_done)
+            SEQUENCE_RESYNCS_TOTAL.labels(self.name).inc()
+            logging.warning(f"Sequence mismatch on wallet {self.name}, resyncing")
+        await asyncio.shield(self._resync)
+
+    def _resync_done(self, _):
+        self._resync = None
+
+    async def _allocate(self, operation: Callable, *args):
+        """Run an operation of the sequence allocator, off the event loop if it may wait on another process"""
+        if not self._sequence.blocking:
+            return operation(*args)
+        return await asyncio.get_event_loop().run_in_executor(get_store_executor(), operation, *args)
+
+    async def reserve_sequence(self) -> int:
+        return (await self.reserve_sequences(1))[0]
+
+    async def reserve_sequences(self, count: int) -> List[int]:
+        sequences = await self._allocate(self._sequence.reserve, count)
+        self._get_broadcast_order().hold(sequences)
+        return sequences
+
+    async def release_sequence(self, sequence: int) -> bool:
+        self._get_broadcast_order().done(sequence)
+        return await self._allocate(self._sequence.release, sequence)
+
+    async def mark_sequence_used(self, sequence: int):
+        self._get_broadcast_order().done(sequence)
+        await self._allocate(self._sequence.mark_used, sequence)
+
+    def sequenced_wallet(self, sequence: int) -> SequencedWallet:
+        send_key = self._signing_pool is not None and self._signing_pool.needs_key(self.name)
+        return SequencedWallet(self.wallet, sequence, name=self.name, send_key=send_key)
+
+    def has_same_keys(self, wallet_settings: WalletSettings) -> bool:
+        """Check if the settings derive this wallet in the same environment, so it can be kept on a reload"""
+        current = self._settings
+        return (
+            _secret_value(current.private_key) == _secret_value(wallet_settings.private_key) and
+            _secret_value(current.mnemonic) == _secret_value(wallet_settings.mnemonic) and
+            current.env_name == wallet_settings.env_name and
+            current.api_url == wallet_settings.api_url
+        )
+
+    def update_settings(self, wallet_settings: WalletSettings):
+        """Take the permissions, ip whitelist and rate limit of reloaded settings with the same keys"""
+        self._settings = wallet_settings
 
-        logging.info(f"Initialised wallet {wallet_settings.name} with {log_init_type}")
+    def set_signing_pool(self, signing_pool: Optional[SigningPool]):
+        self._signing_pool = signing_pool
 
     def ip_authorised(self, ip_address: str):
         if not self.ip_whitelist:
@@ -107,10 +313,14 @@ class WalletConfig:
             'name': self.name,
             'permissions': self.permissions,
             'env': self._settings.env_name,
-            'address': self._wallet.address,
-            'public_key': self._wallet.public_key_hex
+            'address': self.wallet.address,
+            'public_key': self.wallet.public_key_hex
         }
 
+    @property
+    def initialised(self) -> bool:
+        return self._initialised
+
     @property
     def name(self):
         return self._settings.name
@@ -123,24 +333,254 @@ class WalletConfig:
     def permissions(self):
         return self._settings.permissions
 
+    @property
+    def rate_limit(self) -> Optional[RateLimitSettings]:
+        return self._settings.rate_limit
+
     @property
     def env(self):
-        return self._wallet.env
+        return self._env
+
+    @property
+    def derived(self) -> bool:
+        return self._wallet is not None
 
     @property
-    def wallet(self):
-        return self._wallet
+    def wallet(self) -> Wallet:
+        return self._wallet or self._derive()
+
+    @property
+    def sequence(self) -> SequenceAllocator:
+        return self._sequence
 
     @property
     async def http_client(self) -> AsyncHttpApiClient:
         if not self._http_client:
-            self._http_client = await AsyncHttpApiClient.create(env=self.env)
+            self._http_client = await ServiceConfig().get_http_client(self.env)
 
         return self._http_client
 
-    async def broadcast_msg(self, hex_data: str, sync: bool = False):
+    @property
+    def open_orders(self) -> OpenOrderIndex:
+        if self._open_orders is None:
+            self._open_orders = OpenOrderIndex(
+                self.fetch_open_orders, interval=ServiceConfig().settings.open_order_sync_interval_seconds
+            )
+        return self._open_orders
+
+    async def fetch_open_orders(self) -> List[Dict]:
+        """Load all open orders of the wallet from the node"""
         http_client = await self.http_client
-        await http_client.broadcast_hex_msg(hex_data, sync=sync)
+        orders: List[Dict] = []
+        while True:
+            res = await http_client.get_open_orders(self.wallet.address, offset=len(orders), limit=OPEN_ORDERS_PAGE)
+            page = res.get('order') or []
+            orders.extend(page)
+            if len(page) < OPEN_ORDERS_PAGE:
+                return orders
+
+    async def _sign(self, msg: Msg) -> bytes:
+        with time_stage('sign'):
+            if self._signing_pool:
+                return await self._signing_pool.sign(msg)
+            return self._get_encoder().encode(msg)
+
+    async def sign_msg(self, msg: Msg) -> bytes:
+        """Sign a msg created with a sequenced wallet, marking its sequence as used"""
+        sequence = msg.wallet.sequence
+        try:
+            hex_data = await self._sign(msg)
+        except Exception:
+            await self.release_sequence(sequence)
+            raise
+        await self.mark_sequence_used(sequence)
+        return hex_data
+
+    async def sign_msgs(self, msgs: List[Msg]) -> List[bytes]:
+        """Sign msgs created with sequenced wallets concurrently, marking their sequences as used
+
+        If any msg fails to sign none of the hex data is returned, so every sequence is released, highest first
+
+        """
+        signed = await asyncio.gather(*[self._sign(msg) for msg in msgs], return_exceptions=True)
+        errors = [res for res in signed if isinstance(res, BaseException)]
+        if errors:
+            for msg in reversed(msgs):
+                await self.release_sequence(msg.wallet.sequence)
+            raise errors[0]
+        for msg in msgs:
+            await self.mark_sequence_used(msg.wallet.sequence)
+        return signed
+
+    async def broadcast_signed(self, hex_data: bytes, sequence: int, sync: bool = False, msgs: Sequence[Msg] = ()):
+        """Broadcast a signed msg, marking its sequence as used
+
+        The broadcast waits for those of lower sequences reserved by this process, so the node receives them in order.
+        The sequence is released if the broadcast fails so it may be used by the next msg
+
+        :param msgs: the signed msgs, to update the open orders of the wallet once accepted
+
+        """
+        in_flight = BROADCASTS_IN_FLIGHT.labels(self.name)
+        in_flight.inc()
+        try:
+            with time_stage('broadcast'):
+                await self._get_broadcast_order().wait(sequence)
+                http_client = await self.http_client
+                res = await http_client.broadcast_hex_msg(hex_data, sync=sync)
+        except Exception as e:
+            current = await self.release_sequence(sequence)
+            if not is_sequence_error(e):
+                raise
+            # sequences below the chain sequence are forgotten by a resync, only resync once for them
+            if current:
+                await self.resync_sequence()
+            raise SequenceMismatch(f"Sequence {sequence} rejected, wallet {self.name} has been resynced") from e
+        finally:
+            in_flight.dec()
+        self._get_broadcast_order().sent(sequence)
+        await self.mark_sequence_used(sequence)
+        if msgs and isinstance(res, list) and not any(r.get('code') for r in res if isinstance(r, dict)):
+            self.open_orders.apply(msgs)
+        ServiceConfig().track_transactions(self, http_client, res)
+        return res
+
+    async def broadcast_msg(self, msg: Msg, sync: bool = False):
+        """Sign and broadcast a msg created with a sequenced wallet"""
+        sequence = msg.wallet.sequence
+        try:
+            hex_data = await self._sign(msg)
+        except Exception:
+            await self.release_sequence(sequence)
+            raise
+        return await self.broadcast_signed(hex_data, sequence, sync=sync, msgs=[msg])
+
+    async def sign_tx(self, msgs: List[Msg]) -> bytes:
+        """Sign msgs created with the same sequenced wallet as one transaction
+
+        The sequence stays reserved, to be marked used by the broadcast or released by the caller
+
+        """
+        with time_stage('sign'):
+            if self._signing_pool:
+                return await self._signing_pool.sign_tx(msgs)
+            return self._get_encoder().encode_tx(msgs)
+
+    async def queue_broadcast(self, msg: Msg, username: str, sync: bool = False) -> BroadcastTicket:
+        """Sign a msg and queue it for broadcast, returning a ticket to track it
+
+        Raises BroadcastQueueFull if the queue of the wallet is full
+
+        """
+        sequence = msg.wallet.sequence
+        try:
+            if self._get_broadcast_queue().full():
+                raise BroadcastQueueFull(f"Broadcast queue for wallet {self.name} is full")
+            hex_data = await self._sign(msg)
+        except Exception:
+            await self.release_sequence(sequence)
+            raise
+        return await self.queue_signed(hex_data, sequence, username, sync=sync, msgs=[msg])
+
+    async def queue_signed(self, hex_data: bytes, sequence: int, username: str, sync: bool = False,
+                           msgs: Sequence[Msg] = ()) -> BroadcastTicket:
+        """Queue a signed tx for broadcast, returning a ticket to track it
+
+        Raises BroadcastQueueFull if the queue of the wallet is full, releasing the sequence
+
+        """
+        ticket = BroadcastTicket(username, self.name, hex_data, sequence, sync=sync, msgs=msgs)
+        try:
+            self._get_broadcast_queue().submit(ticket)
+        except Exception:
+            await self.release_sequence(sequence)
+            raise
+
+        ServiceConfig().add_broadcast_ticket(ticket)
+        return ticket
+
+    def _get_encoder(self) -> MsgEncoder:
+        if not self._encoder:
+            self._encoder = MsgEncoder(maxsize=ServiceConfig().settings.msg_template_cache_size)
+        return self._encoder
+
+    def _get_broadcast_queue(self) -> BroadcastQueue:
+        if not self._broadcast_queue:
+            settings = ServiceConfig().settings
+            self._broadcast_queue = BroadcastQueue(self, max_depth=settings.broadcast_queue_size)
+        return self._broadcast_queue
+
+    def _get_broadcast_order(self) -> BroadcastOrder:
+        if not self._broadcast_order:
+            settings = ServiceConfig().settings
+            self._broadcast_order = BroadcastOrder(timeout=settings.broadcast_order_timeout_ms / 1000)
+        return self._broadcast_order
+
+    async def close(self):
+        if self._broadcast_queue:
+            await self._broadcast_queue.close()
+            self._broadcast_queue = None
+        if self._open_orders is not None:
+            await self._open_orders.close()
+
+
+class ConfigState:
+    """Settings, wallets and user indexes of one version of the config
+
+    A reload builds a new state and swaps it in as a whole, so a request never sees a mix of old and new config
+
+    """
+
+    def __init__(self, settings: Settings, wallets: Dict[str, WalletConfig], version: int):
+        self.settings = settings
+        self.wallets = wallets
+        self.version = version
+        self.users: Dict[str, UserSettings] = {}
+        self.user_wallet_permissions: Dict[Tuple[str, str], FrozenSet[WalletPermission]] = {}
+        # permissions are taken from the settings as wallets kept on a reload are only updated once swapped in
+        self._wallet_settings: Dict[str, WalletSettings] = {w.name: w for w in settings.wallets}
+        self._wallet_records: Dict[str, Dict] = {}
+        self._user_wallet_info: Dict[str, List[Dict]] = {}
+        self._build_user_index()
+
+        # wallet info needs the address of each wallet, so it is built on first read if wallets are derived lazily
+        if not settings.lazy_wallet_derivation:
+            for username in self.users:
+                self.get_user_wallet_info(username)
+
+    def _build_user_index(self):
+        """Precompute user lookups and user wallet permissions"""
+        for user in self.settings.users:
+            if user.username in self.users:
+                continue
+            self.users[user.username] = user
+
+            for user_wallet in user.wallet_permissions:
+                self.user_wallet_permissions.setdefault(
+                    (user.username, user_wallet.wallet_name), frozenset(user_wallet.permissions)
+                )
+
+    def _wallet_record(self, name: str) -> Dict:
+        record = self._wallet_records.get(name)
+        if record is None:
+            record = {**self.wallets[name].asdict(), 'permissions': self._wallet_settings[name].permissions}
+            self._wallet_records[name] = record
+        return record
+
+    def get_user_wallet_info(self, username: str) -> List[Dict]:
+        """Info of the wallets a user has permissions on, limited to those permissions"""
+        user_info = self._user_wallet_info.get(username)
+        if user_info is not None or username not in self.users:
+            return user_info or []
+
+        user_info = []
+        for name in self.wallets:
+            user_permissions = self.user_wallet_permissions.get((username, name), frozenset())
+            wallet_permissions = [p for p in self._wallet_settings[name].permissions if p in user_permissions]
+            if wallet_permissions:
+                user_info.append({**self._wallet_record(name), 'permissions': wallet_permissions})
+        self._user_wallet_info[username] = user_info
+        return user_info
 
 
 class ServiceConfig:
@@ -148,37 +588,256 @@ class ServiceConfig:
 
     class __ServiceConfig:
         def __init__(self):
-            self._settings: Optional[Settings] = None
-            self._wallets: Optional[Dict[str, WalletConfig]] = None
+            self._state: Optional[ConfigState] = None
+            self._signing_pool: Optional[SigningPool] = None
+            self._http_clients: Dict[str, PooledHttpApiClient] = {}
+            self._broadcast_tickets: Optional[LRUCache] = None
+            self._tx_records: Optional[LRUCache] = None
+            self._confirmation_pollers: Dict[str, ConfirmationPoller] = {}
+            self._reload_lock: Optional[asyncio.Lock] = None
 
         def initialise_config(self, config: Dict):
-            self._settings = Settings(**config)
-
-            self._wallets: Dict[str, WalletConfig] = {w.name: WalletConfig(w) for w in self._settings.wallets}
+            settings = Settings(**config)
+            wallets: Dict[str, WalletConfig] = {w.name: w for w in self._create_wallets(settings, settings.wallets)}
+
+            self._swap_signing_pool(self._create_signing_pool(settings, wallets), wallets)
+            self._state = ConfigState(settings, wallets, self.version + 1)
+
+            if self._broadcast_tickets is None:
+                self._broadcast_tickets = LRUCache(maxsize=settings.broadcast_ticket_cache_size)
+            if self._tx_records is None:
+                self._tx_records = LRUCache(maxsize=settings.tx_status_cache_size)
+
+        async def reload_config(self, config: Dict):
+            """Load a changed config and swap it in, keeping wallets whose keys and environment did not change
+
+            Kept wallets hold on to their sequences, broadcast queues and http clients and take the new permissions.
+            New and changed wallets are derived off the event loop and initialised before the swap, wallets that
+            were removed or replaced are closed after it.
+
+            """
+            if not self._reload_lock:
+                self._reload_lock = asyncio.Lock()
+
+            async with self._reload_lock:
+                settings = Settings(**config)
+                current = self._state
+                loop = asyncio.get_event_loop()
+
+                wallets: Dict[str, WalletConfig] = {}
+                kept: List[Tuple[WalletConfig, WalletSettings]] = []
+                derive: List[WalletSettings] = []
+                for wallet_settings in settings.wallets:
+                    wallet = current.wallets.get(wallet_settings.name)
+                    if wallet and wallet.has_same_keys(wallet_settings):
+                        wallets[wallet_settings.name] = wallet
+                        kept.append((wallet, wallet_settings))
+                    else:
+                        derive.append(wallet_settings)
+
+                created = await loop.run_in_executor(None, self._create_wallets, settings, derive)
+                for wallet in created:
+                    wallets[wallet.name] = wallet
+                # removed from the config or replaced by a wallet with new keys
+                removed = [w for name, w in current.wallets.items() if wallets.get(name) is not w]
+
+                await self._initialise_http_clients(created)
+                await self._initialise_wallets(created)
+
+                signing_pool = self._signing_pool
+                if (created or removed or settings.signing_workers != current.settings.signing_workers or
+                        settings.msg_template_cache_size != current.settings.msg_template_cache_size):
+                    # signing workers hold the keys of the wallets
+                    signing_pool = self._create_signing_pool(settings, wallets)
+                state = ConfigState(settings, wallets, current.version + 1)
+
+                # swap without yielding to the event loop
+                for wallet, wallet_settings in kept:
+                    wallet.update_settings(wallet_settings)
+                self._swap_signing_pool(signing_pool, wallets)
+                self._state = state
+                self._broadcast_tickets.resize(settings.broadcast_ticket_cache_size)
+                self._tx_records.resize(settings.tx_status_cache_size)
+
+                for wallet in removed:
+                    await wallet.close()
+
+                logging.info(
+                    f"Reloaded config version {state.version}, kept {len(kept)} wallets, "
+                    f"derived {[w.name for w in created]}, closed {[w.name for w in removed]}"
+                )
+
+        @staticmethod
+        def _create_wallets(settings: Settings, wallet_settings: List[WalletSettings]) -> List[WalletConfig]:
+            """Create wallets, deriving the keys of mnemonic wallets across processes unless derivation is lazy"""
+            if settings.lazy_wallet_derivation:
+                return [WalletConfig(w, lazy=True) for w in wallet_settings]
+
+            mnemonic_wallets = [w for w in wallet_settings if not w.private_key]
+            private_keys = derive_private_keys(
+                [w.mnemonic.get_secret_value() for w in mnemonic_wallets], workers=settings.wallet_derivation_workers
+            )
+            derived = {id(w): private_key for w, private_key in zip(mnemonic_wallets, private_keys)}
+            return [WalletConfig(w, private_key=derived.get(id(w))) for w in wallet_settings]
+
+        @staticmethod
+        def _create_signing_pool(settings: Settings, wallets: Dict[str, WalletConfig]) -> Optional[SigningPool]:
+            if settings.signing_workers <= 0:
+                return None
+            return SigningPool(
+                workers=settings.signing_workers,
+                wallet_keys={name: wallet.wallet_key() for name, wallet in wallets.items()},
+                template_cache_size=settings.msg_template_cache_size
+            )
+
+        def _swap_signing_pool(self, signing_pool: Optional[SigningPool], wallets: Dict[str, WalletConfig]):
+            """Set the signing pool of the wallets, shutting down a replaced pool holding old keys"""
+            for wallet in wallets.values():
+                wallet.set_signing_pool(signing_pool)
+
+            if self._signing_pool and self._signing_pool is not signing_pool:
+                # signs already submitted to the old pool still complete
+                self._signing_pool.shutdown()
+            self._signing_pool = signing_pool
+
+        async def get_http_client(self, env: BinanceEnvironment) -> PooledHttpApiClient:
+            """Get the http client shared by all wallets in the environment"""
+            client = self._http_clients.get(env.api_url)
+            if not client:
+                client = PooledHttpApiClient(
+                    env=env,
+                    connection_limit=self.settings.http_connection_limit,
+                    keepalive_timeout=self.settings.http_keepalive_timeout
+                )
+                self._http_clients[env.api_url] = client
+            return client
+
+        async def initialise_http_clients(self):
+            await self._initialise_http_clients(list(self.wallets.values()))
+
+        async def _initialise_http_clients(self, wallets: List[WalletConfig]):
+            """Create and warm the http client of each environment used by the wallets"""
+            envs = {w.env.api_url: w.env for w in wallets if w.env.api_url not in self._http_clients}
+            clients = [await self.get_http_client(env) for env in envs.values()]
+            results = await asyncio.gather(*[client.warm() for client in clients], return_exceptions=True)
+            for client, res in zip(clients, results):
+                if isinstance(res, Exception):
+                    logging.warning(f"Unable to warm http client for {client.env.api_url}: {res}")
+
+        def add_broadcast_ticket(self, ticket: BroadcastTicket):
+            self._broadcast_tickets.set(
+                ticket.id, ticket, expires=ticket.created + self.settings.broadcast_ticket_ttl_seconds
+            )
+
+        def get_broadcast_ticket(self, ticket_id: str) -> Optional[BroadcastTicket]:
+            return self._broadcast_tickets.get(ticket_id)
+
+        def track_transactions(self, wallet: WalletConfig, http_client: AsyncHttpApiClient, results):
+            """Record the txs accepted by a broadcast and poll the node of the environment for their confirmation"""
+            settings = self.settings
+            if not settings.tx_poll_interval_ms or not isinstance(results, list):
+                return
+
+            poller = self._confirmation_pollers.get(wallet.env.api_url)
+            if not poller:
+                poller = ConfirmationPoller(
+                    http_client,
+                    interval=settings.tx_poll_interval_ms / 1000,
+                    batch_size=settings.tx_poll_batch_size,
+                    timeout=settings.tx_confirmation_timeout_seconds,
+                    max_pending=settings.tx_status_cache_size,
+                    is_kept=self._tx_records.__contains__
+                )
+                self._confirmation_pollers[wallet.env.api_url] = poller
+
+            for res in results:
+                if not isinstance(res, dict) or not res.get('hash') or res.get('code'):
+                    continue
+                record = TxRecord(res['hash'], wallet.name)
+                self._tx_records.set(record.hash, record, expires=record.created + settings.tx_status_ttl_seconds)
+                poller.track(record)
+
+        def get_tx_record(self, tx_hash: str) -> Optional[TxRecord]:
+            return self._tx_records.get(tx_hash.upper())
+
+        async def shutdown(self):
+            for wallet in self.wallets.values():
+                await wallet.close()
+
+            if self._signing_pool:
+                self._signing_pool.shutdown()
+                self._signing_pool = None
+
+            for poller in self._confirmation_pollers.values():
+                await poller.close()
+            self._confirmation_pollers = {}
+
+            # clients are kept until shutdown as requests of wallets removed on a reload may still be using them
+            for client in self._http_clients.values():
+                await client.close()
+            self._http_clients = {}
+
+        def get_user(self, username: str) -> Optional[UserSettings]:
+            return self._state.users.get(username)
+
+        def get_user_wallet_permissions(self, username: str, wallet_name: str) -> FrozenSet[WalletPermission]:
+            return self._state.user_wallet_permissions.get((username, wallet_name), frozenset())
+
+        async def get_user_wallet_info(self, username: str, wallet_name: Optional[str] = None) -> List[Dict]:
+            """Info of the wallets of a user, lazily derived wallets are derived in an executor first"""
+            state = self._state
+            names = [wallet_name] if wallet_name else list(state.wallets)
+            wallets = [
+                state.wallets[name] for name in names
+                if name in state.wallets and not state.wallets[name].derived and
+                state.user_wallet_permissions.get((username, name))
+            ]
+            if wallets:
+                await asyncio.gather(*[wallet.derive() for wallet in wallets])
+            wallet_info = state.get_user_wallet_info(username)
+            if wallet_name:
+                return [w for w in wallet_info if w['name'] == wallet_name]
+            return wallet_info
+
+        async def initialise_wallets(self):
+            await self._initialise_wallets(list(self.wallets.values()))
+
+        async def _initialise_wallets(self, wallets: List[WalletConfig]):
+            """Initialise wallets concurrently, failed and lazily derived wallets are initialised on first use"""
+            wallets = [w for w in wallets if w.derived]
+            results = await asyncio.gather(*[w.initialise() for w in wallets], return_exceptions=True)
+            for wallet, res in zip(wallets, results):
+                if isinstance(res, Exception):
+                    logging.warning(f"Unable to initialise wallet {wallet.name}: {res}")
 
         async def get_wallet(self, wallet_name: Optional[str] = None, initialise=True) -> Optional[WalletConfig]:
             if not wallet_name:
                 return None
 
-            wallet = self._wallets.get(wallet_name, None)
+            wallet = self.wallets.get(wallet_name, None)
             if not wallet:
                 return None
 
-            if initialise:
-                wallet.wallet.initialise_wallet()
+            if initialise and not wallet.initialised:
+                await wallet.initialise()
             return wallet
 
         @property
         def settings(self) -> Settings:
-            return self._settings
+            return self._state.settings if self._state else None
+
+        @property
+        def version(self) -> int:
+            """Incremented each time the config is loaded or reloaded, used to invalidate caches"""
+            return self._state.version if self._state else 0
 
         @property
         def wallets(self) -> Dict[str, WalletConfig]:
-            return self._wallets
+            return self._state.wallets if self._state else None
 
         @property
         def users(self) -> List[UserSettings]:
-            return self._settings.users
+            return self.settings.users
 
     def __init__(self):
         if not ServiceConfig.instance:
@@ -190,3 +849,19 @@ class ServiceConfig:
     @classmethod
     def initialise_config(cls, config: Dict):
         ServiceConfig.instance.initialise_config(config)
+
+    @classmethod
+    async def reload_config(cls, config: Dict):
+        await ServiceConfig.instance.reload_config(config)
+
+    @classmethod
+    async def initialise_wallets(cls):
+        await ServiceConfig.instance.initialise_wallets()
+
+    @classmethod
+    async def initialise_http_clients(cls):
+        await ServiceConfig.instance.initialise_http_clients()
+
+    @classmethod
+    async def shutdown(cls):
+        await ServiceConfig.instance.shutdown()
@@ -0,0 +1,146 @@
+import asyncio
+import contextvars
+import logging
+import time
+from collections import OrderedDict
+from itertools import islice
+from typing import Callable, Dict, List, Optional
+
+from binance_chain.exceptions import BinanceChainAPIException
+from binance_chain.http import AsyncHttpApiClient
+
+from api.constants.constants import TxStatus
+from api.utils.metrics import TX_CONFIRMATIONS_TOTAL
+
+
+class TxRecord:
+    """Tracks the confirmation of a broadcast tx"""
+
+    def __init__(self, tx_hash: str, wallet_name: str):
+        self.hash = tx_hash.upper()
+        self.wallet_name = wallet_name
+        self.created = time.time()
+        self.status = TxStatus.PENDING
+        self.height: Optional[int] = None
+        self.code: Optional[int] = None
+        self.log: Optional[str] = None
+        self._done = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status != TxStatus.PENDING
+
+    def finish(self, status: TxStatus, code: Optional[int] = None, height: Optional[int] = None,
+               log: Optional[str] = None):
+        self.status = status
+        self.code = code
+        self.height = height
+        self.log = log
+        self._done.set()
+        TX_CONFIRMATIONS_TOTAL.labels(status.value).inc()
+
+    async def wait(self, timeout: float):
+        """Wait up to timeout seconds for the tx to be committed, failed or expired"""
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def asdict(self) -> Dict:
+        return {
+            'hash': self.hash,
+            'wallet_name': self.wallet_name,
+            'status': self.status,
+            'height': self.height,
+            'code': self.code,
+            'log': self.log,
+        }
+
+
+class ConfirmationPoller:
+    """Polls the node of an environment for the txs broadcast through it until they are committed
+
+    Each round looks up a batch of the longest waiting txs concurrently over the shared http client, so any number of
+    clients waiting on txs cost one polling loop. Txs the node hasn't found within the timeout are expired.
+
+    At most max_pending txs are tracked, the longest waiting are dropped beyond that, as are txs whose record is no
+    longer kept for status requests.
+
+    """
+
+    def __init__(self, http_client: AsyncHttpApiClient, interval: float, batch_size: int, timeout: float,
+                 max_pending: int, is_kept: Callable[[str], bool]):
+        self._http_client = http_client
+        self._interval = interval
+        self._batch_size = batch_size
+        self._timeout = timeout
+        self._max_pending = max_pending
+        self._is_kept = is_kept
+        self._pending: 'OrderedDict[str, TxRecord]' = OrderedDict()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def track(self, record: TxRecord):
+        self._pending[record.hash] = record
+        while len(self._pending) > self._max_pending:
+            _, dropped = self._pending.popitem(last=False)
+            dropped.finish(TxStatus.EXPIRED, log="Not tracked, too many txs pending")
+        self._wakeup.set()
+
+        if not self._task:
+            # start the poller in a fresh context so it isn't tied to the request that broadcast the first tx
+            self._task = contextvars.Context().run(asyncio.ensure_future, self._run())
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(self._interval)
+
+            for tx_hash in [tx_hash for tx_hash in self._pending if not self._is_kept(tx_hash)]:
+                # evicted from the status records, nobody can ask for it any more
+                del self._pending[tx_hash]
+
+            try:
+                await self._poll(list(islice(self._pending.values(), self._batch_size)))
+            except Exception:
+                logging.exception(f"Confirmation poller for {self._http_client.env.api_url} failed")
+
+            if not self._pending:
+                self._wakeup.clear()
+
+    async def _poll(self, batch: List[TxRecord]):
+        results = await asyncio.gather(
+            *[self._http_client.get_transaction(record.hash) for record in batch], return_exceptions=True
+        )
+
+        # track() may have dropped records of the batch to stay under max_pending while it was looked up
+        now = time.time()
+        for record, res in zip(batch, results):
+            if isinstance(res, Exception):
+                # the node returns 404 until the tx is in a block
+                if not isinstance(res, BinanceChainAPIException) or res.status_code != 404:
+                    logging.warning(f"Unable to look up tx {record.hash}: {res}")
+                if now - record.created >= self._timeout:
+                    self._pending.pop(record.hash, None)
+                    record.finish(TxStatus.EXPIRED, log=f"Not found after {self._timeout}s")
+                elif record.hash in self._pending:
+                    # give txs behind it in the queue a turn
+                    self._pending.move_to_end(record.hash)
+                continue
+
+            self._pending.pop(record.hash, None)
+            code = res.get('code') or 0
+            height = res.get('height')
+            record.finish(
+                TxStatus.COMMITTED if code == 0 else TxStatus.FAILED,
+                code=code, height=int(height) if height else None, log=res.get('log')
+            )
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,197 @@
+import abc
+import binascii
+import json
+from typing import Dict, List, Optional, Tuple, Type
+
+from binance_chain.messages import BROADCAST_SOURCE, Msg, NewOrderMsg, CancelOrderMsg, PubKeyMsg, StdTxMsg
+from binance_chain.utils.encode_utils import varint_encode
+
+from api.utils.cache import LRUCache
+
+
+def _varint(value: int) -> bytes:
+    # int64 fields encode negative values as 64 bit two's complement
+    return varint_encode(value & 0xFFFFFFFFFFFFFFFF)
+
+
+def _bytes_field(number: int, value: bytes) -> bytes:
+    """Encode a length delimited protobuf field, empty values are omitted as in proto3"""
+    if not value:
+        return b''
+    return _varint(number << 3 | 2) + _varint(len(value)) + value
+
+
+def _int_field(number: int, value: int) -> bytes:
+    if not value:
+        return b''
+    return _varint(number << 3) + _varint(value)
+
+
+def _json(value) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+
+class MsgTemplate(abc.ABC):
+    """Pre-encoded parts of the signed transaction of a msg type for one wallet and symbol
+
+    Only the fields that change between msgs, like the price, quantity, order id and sequence, are encoded when a
+    msg is signed. The output is the same as Msg.to_hex_data()
+
+    """
+
+    def __init__(self, msg: Msg):
+        wallet = msg.wallet
+        self._sign_prefix = (
+            f'{{"account_number":{_json(str(wallet.account_number))},"chain_id":{_json(wallet.chain_id)},'
+            f'"data":null,"memo":'
+        )
+        self._sign_suffix = f',"source":{_json(str(BROADCAST_SOURCE))}}}'
+        self._msg_type = binascii.unhexlify(msg.AMINO_MESSAGE_TYPE)
+        self._std_tx_type = binascii.unhexlify(StdTxMsg.AMINO_MESSAGE_TYPE)
+        self._pub_key_field = _bytes_field(1, PubKeyMsg(wallet).to_amino())
+        self._account_number_field = _int_field(3, wallet.account_number)
+        self._source_field = _int_field(4, BROADCAST_SOURCE)
+
+    @abc.abstractmethod
+    def _msg_json(self, msg: Msg) -> str:
+        pass
+
+    @abc.abstractmethod
+    def _msg_proto(self, msg: Msg) -> bytes:
+        pass
+
+    def encode(self, msg: Msg) -> bytes:
+        """Sign the msg and return the hex data of the transaction"""
+        return self.encode_tx(msg.wallet, msg.memo, [(self, msg)])
+
+    def encode_tx(self, wallet, memo: str, msgs: List[Tuple['MsgTemplate', Msg]]) -> bytes:
+        """Sign msgs, each with its template, as one transaction and return its hex data"""
+        sequence = wallet.sequence
+
+        msgs_json = ','.join(template._msg_json(msg) for template, msg in msgs)
+        sign_json = (
+            f'{self._sign_prefix}{_json(memo)},"msgs":[{msgs_json}],"sequence":{_json(str(sequence))}'
+            f'{self._sign_suffix}'
+        )
+        signature = wallet.sign_message(sign_json.encode())[-64:]
+
+        std_signature = (
+            self._pub_key_field + _bytes_field(2, signature) + self._account_number_field + _int_field(4, sequence)
+        )
+        msgs_fields = b''.join(
+            _bytes_field(1, template._msg_type + template._msg_proto(msg)) for template, msg in msgs
+        )
+        std_tx = self._std_tx_type + (
+            msgs_fields + _bytes_field(2, std_signature) + _bytes_field(3, memo.encode()) + self._source_field
+        )
+        return binascii.hexlify(_varint(len(std_tx)) + std_tx)
+
+
+class NewOrderTemplate(MsgTemplate):
+
+    def __init__(self, msg: NewOrderMsg):
+        super().__init__(msg)
+        address = msg.wallet.address_decoded
+        self._order_id_prefix = f"{binascii.hexlify(address).decode().upper()}-"
+        self._sender_json = _json(msg.wallet.address)
+        self._symbol_json = _json(msg._symbol)
+        self._sender_field = _bytes_field(1, address)
+        self._symbol_field = _bytes_field(3, msg._symbol.encode())
+
+    def _order_id(self, msg: NewOrderMsg) -> str:
+        return f"{self._order_id_prefix}{msg.wallet.sequence + 1}"
+
+    def _msg_json(self, msg: NewOrderMsg) -> str:
+        return (
+            f'{{"id":{_json(self._order_id(msg))},"ordertype":{_json(msg._order_type)},'
+            f'"price":{_json(msg._price_encoded)},"quantity":{_json(msg._quantity_encoded)},'
+            f'"sender":{self._sender_json},"side":{_json(msg._side)},"symbol":{self._symbol_json},'
+            f'"timeinforce":{_json(msg._time_in_force)}}}'
+        )
+
+    def _msg_proto(self, msg: NewOrderMsg) -> bytes:
+        return (
+            self._sender_field + _bytes_field(2, self._order_id(msg).encode()) + self._symbol_field +
+            _int_field(4, msg._order_type) + _int_field(5, msg._side) + _int_field(6, msg._price_encoded) +
+            _int_field(7, msg._quantity_encoded) + _int_field(8, msg._time_in_force)
+        )
+
+
+class CancelOrderTemplate(MsgTemplate):
+
+    def __init__(self, msg: CancelOrderMsg):
+        super().__init__(msg)
+        self._sender_json = _json(msg.wallet.address)
+        self._symbol_json = _json(msg._symbol)
+        self._sender_field = _bytes_field(1, msg.wallet.address_decoded)
+        self._symbol_field = _bytes_field(2, msg._symbol.encode())
+
+    def _msg_json(self, msg: CancelOrderMsg) -> str:
+        return f'{{"refid":{_json(msg._order_id)},"sender":{self._sender_json},"symbol":{self._symbol_json}}}'
+
+    def _msg_proto(self, msg: CancelOrderMsg) -> bytes:
+        return self._sender_field + self._symbol_field + _bytes_field(3, msg._order_id.encode())
+
+
+# msg types encoded from a template, other msgs are encoded by the library
+MSG_TEMPLATES: Dict[Type[Msg], Type[MsgTemplate]] = {
+    NewOrderMsg: NewOrderTemplate,
+    CancelOrderMsg: CancelOrderTemplate,
+}
+
+
+def get_template_class(msg: Msg) -> Optional[Type[MsgTemplate]]:
+    for msg_cls, template_cls in MSG_TEMPLATES.items():
+        if isinstance(msg, msg_cls):
+            return template_cls
+    return None
+
+
+class MsgEncoder:
+    """Signs the msgs of a wallet, reusing a template per msg type and symbol
+
+    Templates are kept in a least recently used cache, a size of 0 encodes every msg with to_hex_data()
+
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self._templates = LRUCache(maxsize=maxsize)
+        self._enabled = maxsize > 0
+
+    def _get_template(self, msg: Msg, template_cls: Type[MsgTemplate]) -> MsgTemplate:
+        if not self._enabled:
+            return template_cls(msg)
+
+        wallet = msg.wallet
+        key = (template_cls, msg._symbol, wallet.account_number, wallet.chain_id)
+        template = self._templates.get(key)
+        if template is None:
+            template = template_cls(msg)
+            self._templates.set(key, template)
+        return template
+
+    def encode(self, msg: Msg) -> bytes:
+        template_cls = get_template_class(msg) if self._enabled else None
+        if not template_cls:
+            return msg.to_hex_data()
+        return self._get_template(msg, template_cls).encode(msg)
+
+    def encode_tx(self, msgs: List[Msg]) -> bytes:
+        """Sign msgs of one wallet as a single transaction, with the wallet sequence and memo of the first msg
+
+        Only msg types with a template can be combined
+
+        """
+        if len(msgs) == 1:
+            return self.encode(msgs[0])
+
+        templates = []
+        for msg in msgs:
+            template_cls = get_template_class(msg)
+            if not template_cls:
+                raise ValueError(f"{type(msg).__name__} can not be signed with other msgs")
+            templates.append(self._get_template(msg, template_cls))
+        return templates[0].encode_tx(msgs[0].wallet, msgs[0].memo, list(zip(templates, msgs)))
+
+    def __len__(self):
+        return len(self._templates)
@@ -0,0 +1,48 @@
+from typing import Optional
+
+import aiohttp
+
+from binance_chain.environment import BinanceEnvironment
+from binance_chain.exceptions import BinanceChainAPIException
+from binance_chain.http import AsyncHttpApiClient
+
+
+class _ErrorResponse:
+    """Read body of an error response, in the form BinanceChainAPIException expects"""
+
+    def __init__(self, response: aiohttp.ClientResponse, content: bytes):
+        self.status = response.status
+        self.content = content
+        self.text = content.decode(errors='replace')
+        self.request = response.request_info
+
+
+class PooledHttpApiClient(AsyncHttpApiClient):
+    """AsyncHttpApiClient with a bounded pool of keep-alive connections
+
+    One client is shared by all wallets using the same environment.
+
+    """
+
+    def __init__(self, env: Optional[BinanceEnvironment] = None, connection_limit: int = 100,
+                 keepalive_timeout: float = 30):
+        self._connection_limit = connection_limit
+        self._keepalive_timeout = keepalive_timeout
+        super().__init__(env)
+
+    def _init_session(self, **kwargs):
+        connector = aiohttp.TCPConnector(limit=self._connection_limit, keepalive_timeout=self._keepalive_timeout)
+        return aiohttp.ClientSession(connector=connector, headers=self._get_headers())
+
+    async def _handle_response(self, response: aiohttp.ClientResponse):
+        # the body of an aiohttp response must be read before the exception can parse the error code and message
+        if not str(response.status).startswith('2'):
+            raise BinanceChainAPIException(_ErrorResponse(response, await response.read()), response.status)
+        return await super()._handle_response(response)
+
+    async def warm(self):
+        """Open a connection to the node so the first request doesn't pay for the handshake"""
+        await self.get_time()
+
+    async def close(self):
+        await self.session.close()
@@ -0,0 +1,35 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+from binance_chain.environment import BinanceEnvironment
+from binance_chain.wallet import Wallet
+
+
+def create_wallet(private_key: Optional[str], mnemonic: Optional[str], env: BinanceEnvironment) -> Wallet:
+    """Create a wallet from a private key, or derive it from a mnemonic"""
+    if private_key:
+        return Wallet(private_key=private_key, env=env)
+    if mnemonic:
+        return Wallet.create_wallet_from_mnemonic(mnemonic, env=env)
+    raise ValueError("No private_key or mnemonic set")
+
+
+def derive_private_key(mnemonic: str) -> str:
+    """Derive the private key of the Binance Chain account of a mnemonic"""
+    return Wallet.create_wallet_from_mnemonic(mnemonic).private_key
+
+
+def derive_private_keys(mnemonics: List[str], workers: int = 0) -> List[str]:
+    """Derive the private keys of mnemonics across a pool of processes
+
+    BIP39 and BIP32 derivation is CPU bound, a worker count of 0 uses a process per core
+
+    """
+    workers = min(workers or os.cpu_count() or 1, len(mnemonics))
+    if workers <= 1:
+        return [derive_private_key(mnemonic) for mnemonic in mnemonics]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunksize = max(1, len(mnemonics) // (workers * 4))
+        return list(executor.map(derive_private_key, mnemonics, chunksize=chunksize))
@@ -0,0 +1,174 @@
+import asyncio
+import contextvars
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+from binance_chain.constants import TimeInForce
+from binance_chain.exceptions import BinanceChainAPIException
+from binance_chain.messages import CancelOrderMsg, Msg, NewOrderMsg
+
+# orders placed or cancelled this recently may not be reflected in the open orders listed by the node yet
+SYNC_GRACE_SECONDS = 5
+
+# code the node rejects a cancel with when the order is not on the book, dex codespace 6 code 7
+ORDER_NOT_FOUND_CODES = {393223}
+
+
+def closed_orders(error: Exception, msgs: List[CancelOrderMsg]) -> List[CancelOrderMsg]:
+    """Cancel msgs of a rejected tx whose orders the node reports are no longer open, e.g. filled or expired
+
+    Empty if the tx was rejected for any other reason
+
+    """
+    if not isinstance(error, BinanceChainAPIException):
+        return []
+    message = str(error.message)
+    if error.code not in ORDER_NOT_FOUND_CODES and 'failed to find order' not in message.lower():
+        return []
+    # the error names the order, a tx of one msg can only be rejected for its own order
+    named = [msg for msg in msgs if msg._order_id in message]
+    return named or (msgs if len(msgs) == 1 else [])
+
+
+class OpenOrder:
+    """An order resting on the book"""
+
+    __slots__ = ('order_id', 'symbol', 'side', 'price', 'quantity', 'created')
+
+    def __init__(self, order_id: str, symbol: str, side: int, price, quantity, created: Optional[float] = None):
+        self.order_id = order_id
+        self.symbol = symbol
+        self.side = side
+        self.price = price
+        self.quantity = quantity
+        self.created = time.time() if created is None else created
+
+    @classmethod
+    def from_msg(cls, msg: NewOrderMsg) -> 'OpenOrder':
+        return cls(msg.wallet.generate_order_id(), msg._symbol, msg._side, str(msg._price), str(msg._quantity))
+
+    @classmethod
+    def from_node(cls, order: Dict) -> 'OpenOrder':
+        # listed by the node, so a later listing without it means it is closed, however recently it was synced
+        return cls(
+            order['orderId'], order['symbol'], order.get('side'), order.get('price'), order.get('quantity'), created=0
+        )
+
+    def asdict(self) -> Dict:
+        return {
+            'order_id': self.order_id,
+            'symbol': self.symbol,
+            'side': self.side,
+            'price': self.price,
+            'quantity': self.quantity,
+        }
+
+
+class OpenOrderIndex:
+    """Open orders of a wallet by symbol
+
+    Orders are added when a new order msg is broadcast and removed when a cancel msg is broadcast. Orders filled,
+    expired or placed and cancelled outside the service are picked up by syncing with the open orders of the node,
+    on request, or with an interval in the background while the index holds orders.
+
+    """
+
+    def __init__(self, fetch: Callable[[], Awaitable[List[Dict]]], interval: float = 0):
+        self._fetch = fetch
+        self._interval = interval
+        self._orders: Dict[str, Dict[str, OpenOrder]] = {}
+        # order ids removed recently, so a sync doesn't add them back from a stale listing
+        self._removed: Dict[str, float] = {}
+        self._synced = False
+        self._sync: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def synced(self) -> bool:
+        return self._synced
+
+    def __len__(self):
+        return sum(len(orders) for orders in self._orders.values())
+
+    def add(self, order: OpenOrder):
+        self._orders.setdefault(order.symbol, {})[order.order_id] = order
+        self._start()
+
+    def remove(self, order_id: str, symbol: str):
+        orders = self._orders.get(symbol)
+        if orders:
+            orders.pop(order_id, None)
+            if not orders:
+                del self._orders[symbol]
+        self._removed[order_id] = time.time()
+
+    def apply(self, msgs: Iterable[Msg]):
+        """Update the index with msgs accepted by the chain"""
+        for msg in msgs:
+            if isinstance(msg, NewOrderMsg):
+                # immediate or cancel orders never rest on the book
+                if msg._time_in_force != TimeInForce.IMMEDIATE_OR_CANCEL.value:
+                    self.add(OpenOrder.from_msg(msg))
+            elif isinstance(msg, CancelOrderMsg):
+                self.remove(msg._order_id, msg._symbol)
+
+    def orders(self, symbol: Optional[str] = None) -> List[OpenOrder]:
+        """Open orders of a symbol, or all open orders, in the order they were placed"""
+        if symbol:
+            return list(self._orders.get(symbol, {}).values())
+        return [order for orders in self._orders.values() for order in orders.values()]
+
+    async def sync(self):
+        """Replace the index with the open orders of the node, concurrent callers wait on the same sync"""
+        if not self._sync:
+            self._sync = asyncio.ensure_future(self._load())
+            self._sync.add_done_callback(self._sync_done)
+        await asyncio.shield(self._sync)
+
+    def _sync_done(self, _):
+        self._sync = None
+
+    async def _load(self):
+        started = time.time()
+        node_orders = await self._fetch()
+
+        cutoff = started - SYNC_GRACE_SECONDS
+        self._removed = {order_id: removed for order_id, removed in self._removed.items() if removed >= cutoff}
+
+        orders: Dict[str, Dict[str, OpenOrder]] = {}
+        for node_order in node_orders:
+            order = OpenOrder.from_node(node_order)
+            if order.order_id not in self._removed:
+                orders.setdefault(order.symbol, {})[order.order_id] = order
+        for order in self.orders():
+            # placed too recently to be listed by the node
+            if order.created >= cutoff and order.order_id not in orders.get(order.symbol, {}):
+                orders.setdefault(order.symbol, {})[order.order_id] = order
+
+        self._orders = orders
+        self._synced = True
+        self._start()
+
+    def _start(self):
+        if self._interval and self._orders and not self._task:
+            # run in a fresh context so the sync isn't tied to the request that first used the index
+            self._task = contextvars.Context().run(asyncio.ensure_future, self._run())
+
+    async def _run(self):
+        try:
+            while self._orders:
+                await asyncio.sleep(self._interval)
+                try:
+                    await self.sync()
+                except Exception as e:
+                    logging.warning(f"Unable to sync open orders: {e}")
+        finally:
+            # restarted by the next order added
+            if self._task is asyncio.current_task():
+                self._task = None
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import os
+import signal
+from typing import Awaitable, Callable, Optional, Tuple
+
+
+class ConfigReloader:
+    """Reloads the config on SIGHUP, and when the config file changes if a watch interval is set
+
+    Reloads triggered while one is running are coalesced into one more reload once it finishes. A failed reload
+    is logged and the current config kept.
+
+    """
+
+    def __init__(self, path: str, reload: Callable[[], Awaitable[None]], watch_interval: float = 0):
+        self._path = path
+        self._reload = reload
+        self._watch_interval = watch_interval
+        self._file_state = self._stat()
+        self._pending = False
+        self._handling_signal = False
+        self._task: Optional[asyncio.Future] = None
+        self._watch_task: Optional[asyncio.Future] = None
+
+    def _stat(self) -> Optional[Tuple[float, int, int]]:
+        try:
+            stat = os.stat(self._path)
+        except OSError:
+            return None
+        # the inode changes when the file is replaced, e.g. a mounted config map
+        return stat.st_mtime, stat.st_size, stat.st_ino
+
+    def start(self):
+        try:
+            asyncio.get_event_loop().add_signal_handler(signal.SIGHUP, self.trigger)
+            self._handling_signal = True
+        except (AttributeError, NotImplementedError, RuntimeError):
+            logging.warning("Unable to handle SIGHUP, the config is only reloaded if watched")
+
+        if self._watch_interval > 0:
+            self._watch_task = asyncio.ensure_future(self._watch())
+
+    def trigger(self):
+        """Reload the config, or reload again once the running reload finishes"""
+        if self._task:
+            self._pending = True
+            return
+        self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        try:
+            while True:
+                self._pending = False
+                self._file_state = self._stat()
+                logging.info(f"Reloading config from {self._path}")
+                try:
+                    await self._reload()
+                except Exception:
+                    logging.exception("Unable to reload config, keeping the current config")
+                if not self._pending:
+                    break
+        finally:
+            self._task = None
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self._watch_interval)
+            file_state = self._stat()
+            if file_state and file_state != self._file_state:
+                self._file_state = file_state
+                self.trigger()
+
+    async def stop(self):
+        if self._handling_signal:
+            asyncio.get_event_loop().remove_signal_handler(signal.SIGHUP)
+            self._handling_signal = False
+
+        if self._watch_task:
+            self._watch_task.cancel()
+            self._watch_task = None
+
+        # let a running reload finish so wallets it created are closed on shutdown
+        self._pending = False
+        if self._task:
+            await asyncio.shield(self._task)
@@ -0,0 +1,357 @@
+import binascii
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from binance_chain.exceptions import BinanceChainAPIException
+from binance_chain.wallet import Wallet
+
+# invalid sequence codes returned by the chain
+SEQUENCE_ERROR_CODES = {3, 65539}
+
+# seconds a sequence may stay reserved, or used without reaching the chain, before a resync drops it
+DEFAULT_RESERVATION_TTL = 60
+
+# operations of shared allocators wait on a file lock other processes may hold, so they run on these threads
+_store_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_store_executor() -> ThreadPoolExecutor:
+    global _store_executor
+    if not _store_executor:
+        _store_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='sequence-store')
+    return _store_executor
+
+
+class SequenceMismatch(Exception):
+    pass
+
+
+def process_alive(pid: int) -> bool:
+    """Check if a process of this host is still running"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def is_sequence_error(error: Exception) -> bool:
+    """Check if a broadcast was rejected because of the sequence of the account"""
+    if not isinstance(error, BinanceChainAPIException):
+        return False
+    return error.code in SEQUENCE_ERROR_CODES or 'sequence' in str(error.message).lower()
+
+
+class SequenceAllocator:
+    """Hands out account sequence numbers for a wallet
+
+    Sequences are reserved before a msg is signed, then marked as used once the msg has been signed or broadcast,
+    or released if signing or broadcasting fails.
+
+    Released sequences are handed out again before any new sequence so gaps don't build up on the chain.
+
+    Reservations record the process holding them and when they were made, and used sequences when they were used,
+    so a resync can drop those leaked by a killed process or a path that never released them.
+
+    """
+
+    # operations may wait on other processes, so shouldn't be called on the event loop
+    blocking = False
+
+    def __init__(self, sequence: Optional[int] = None, ttl: float = DEFAULT_RESERVATION_TTL):
+        self._lock = threading.Lock()
+        self._ttl = ttl
+        self._next: Optional[int] = None
+        # sequence to pid of the process holding it and time it was reserved
+        self._reserved: Dict[int, Tuple[int, float]] = {}
+        # sequence to time it was used
+        self._used: Dict[int, float] = {}
+        self._released: Set[int] = set()
+        if sequence is not None:
+            self.reset(sequence)
+
+    @contextmanager
+    def _transaction(self, write: bool = True):
+        """Hold the state of the allocator while it is read or updated"""
+        with self._lock:
+            yield
+
+    def _reset(self, sequence: int):
+        self._next = sequence
+        self._reserved.clear()
+        self._used.clear()
+        self._released.clear()
+
+    def reset(self, sequence: int):
+        """Reset the allocator to the sequence of the account on the chain
+
+        Any outstanding reservations are forgotten
+
+        """
+        with self._transaction():
+            self._reset(sequence)
+
+    def _resync(self, sequence: int):
+        now = time.time()
+        self._reserved = {
+            s: (pid, reserved_at) for s, (pid, reserved_at) in self._reserved.items()
+            if s >= sequence and now - reserved_at < self._ttl and process_alive(pid)
+        }
+        self._used = {s: used_at for s, used_at in self._used.items() if s >= sequence and now - used_at < self._ttl}
+        held = set(self._reserved) | set(self._used)
+        self._next = max(held) + 1 if held else sequence
+        self._released = set(range(sequence, self._next)) - held
+
+    def resync(self, sequence: int):
+        """Move to the sequence of the account on the chain after a sequence mismatch
+
+        Live reservations at or above the chain sequence may still be signed and broadcast, so they are kept and the
+        sequences between the chain sequence and them that nobody holds are handed out first. Anything below the
+        chain sequence is stale and forgotten, as are reservations of processes that exited and reservations or
+        used sequences older than the ttl.
+
+        """
+        with self._transaction():
+            self._resync(sequence)
+
+    def initialise(self, sequence: int):
+        """Start from the sequence of the account on the chain
+
+        Live sequences another process sharing the allocator holds above it are kept, as on a resync.
+
+        """
+        with self._transaction():
+            if self._next is None:
+                self._reset(sequence)
+            else:
+                self._resync(sequence)
+
+    def reserve(self, count: int = 1) -> List[int]:
+        """Reserve a number of sequences
+
+        Released sequences are handed out first, the returned list is sorted and contiguous if
+        there were no released sequences waiting.
+
+        """
+        if count < 1:
+            raise ValueError("count must be at least 1")
+
+        with self._transaction():
+            if self._next is None:
+                raise ValueError("Sequence allocator has not been initialised")
+
+            sequences = sorted(self._released)[:count]
+            self._released.difference_update(sequences)
+
+            fresh = count - len(sequences)
+            sequences.extend(range(self._next, self._next + fresh))
+            self._next += fresh
+
+            reservation = (os.getpid(), time.time())
+            self._reserved.update((s, reservation) for s in sequences)
+
+            return sequences
+
+    def mark_used(self, sequence: int):
+        """Mark a reserved sequence as used by a signed or broadcast msg"""
+        with self._transaction():
+            self._reserved.pop(sequence, None)
+            self._used[sequence] = time.time()
+            self._prune_used()
+
+    def release(self, sequence: int) -> bool:
+        """Return a reserved sequence that was not used
+
+        Returns False if the sequence was not reserved, e.g. it was reserved before the allocator was reset
+
+        """
+        with self._transaction():
+            if self._reserved.pop(sequence, None) is None:
+                return False
+
+            if sequence == self._next - 1:
+                # last sequence handed out, roll back rather than leave it waiting
+                self._next -= 1
+                while self._next - 1 in self._released:
+                    self._next -= 1
+                    self._released.discard(self._next)
+            else:
+                self._released.add(sequence)
+            return True
+
+    def _prune_used(self):
+        # only track used sequences that sit above an outstanding reservation
+        outstanding = set(self._reserved) | self._released
+        if not outstanding:
+            self._used.clear()
+            return
+        lowest = min(outstanding)
+        self._used = {s: used_at for s, used_at in self._used.items() if s > lowest}
+
+    @property
+    def initialised(self) -> bool:
+        with self._transaction(write=False):
+            return self._next is not None
+
+    @property
+    def next_sequence(self) -> Optional[int]:
+        with self._transaction(write=False):
+            return self._next
+
+    @property
+    def reserved(self) -> Set[int]:
+        with self._transaction(write=False):
+            return set(self._reserved)
+
+    @property
+    def used(self) -> Set[int]:
+        with self._transaction(write=False):
+            return set(self._used)
+
+    @property
+    def released(self) -> Set[int]:
+        with self._transaction(write=False):
+            return set(self._released)
+
+
+class SharedSequenceAllocator(SequenceAllocator):
+    """Sequence allocator with its state in a file shared by the processes signing for a wallet
+
+    Each operation holds an exclusive lock while it reads, updates and writes the state, so worker processes on
+    the same host never hand out the same sequence. Keep the file on a memory backed filesystem such as /dev/shm.
+
+    Operations may wait on the lock of another process, run them off the event loop.
+
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, ttl: float = DEFAULT_RESERVATION_TTL):
+        if fcntl is None:
+            raise Exception("A shared sequence store requires fcntl file locks")
+        self._path = path
+        self._lock_path = f"{path}.lock"
+        self._lock_file = None
+        self._lock_pid: Optional[int] = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        super().__init__(ttl=ttl)
+
+    def _get_lock_file(self):
+        # file locks are shared with forked children through the open file, so each process opens its own
+        if self._lock_pid != os.getpid():
+            self._lock_file = open(self._lock_path, 'a')
+            self._lock_pid = os.getpid()
+        return self._lock_file
+
+    @contextmanager
+    def _transaction(self, write: bool = True):
+        with self._lock:
+            lock_file = self._get_lock_file()
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX if write else fcntl.LOCK_SH)
+            try:
+                self._load()
+                yield
+                if write:
+                    self._save()
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _load(self):
+        try:
+            with open(self._path, 'r') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            state = {}
+        self._next = state.get('next')
+        self._reserved = {s: (pid, reserved_at) for s, pid, reserved_at in state.get('reserved', [])}
+        self._used = {s: used_at for s, used_at in state.get('used', [])}
+        self._released = set(state.get('released', []))
+
+    def _save(self):
+        state = {
+            'next': self._next,
+            'reserved': sorted([s, pid, reserved_at] for s, (pid, reserved_at) in self._reserved.items()),
+            'used': sorted([s, used_at] for s, used_at in self._used.items()),
+            'released': sorted(self._released),
+        }
+        # replace the file so a reader never sees a partial write
+        tmp_path = f"{self._path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self._path)
+
+
+class SequencedWallet:
+    """View of a Wallet pinned to a reserved sequence
+
+    Messages created with this view sign with the pinned sequence, so concurrent requests don't depend on the
+    sequence stored on the shared Wallet.
+
+    With send_key set the private key is sent along with the reference, for signing workers only holding the
+    mnemonic of the wallet.
+
+    """
+
+    def __init__(self, wallet: Wallet, sequence: int, name: Optional[str] = None,
+                 account_number: Optional[int] = None, chain_id: Optional[str] = None, send_key: bool = False):
+        self._wallet = wallet
+        self._sequence = sequence
+        self._name = name
+        self._send_key = send_key
+        self._account_number = wallet.account_number if account_number is None else account_number
+        self._chain_id = wallet.chain_id if chain_id is None else chain_id
+
+    def __getattr__(self, name):
+        return getattr(self._wallet, name)
+
+    def __reduce__(self):
+        # signing workers hold their own copy of the wallet keys, only send a reference to the wallet
+        private_key = self._wallet.private_key if self._send_key else None
+        return _restore_sequenced_wallet, (
+            self._name, self._sequence, self._account_number, self._chain_id, private_key
+        )
+
+    @property
+    def name(self) -> Optional[str]:
+        return self._name
+
+    @property
+    def sequence(self) -> int:
+        return self._sequence
+
+    @property
+    def account_number(self) -> Optional[int]:
+        return self._account_number
+
+    @property
+    def chain_id(self) -> Optional[str]:
+        return self._chain_id
+
+    def generate_order_id(self) -> str:
+        return f"{binascii.hexlify(self._wallet.address_decoded).decode().upper()}-{(self._sequence + 1)}"
+
+    def increment_account_sequence(self):
+        # sequences are managed by the SequenceAllocator
+        pass
+
+    def decrement_account_sequence(self):
+        pass
+
+
+def _restore_sequenced_wallet(name: str, sequence: int, account_number: Optional[int], chain_id: Optional[str],
+                              private_key: Optional[str] = None):
+    from config.signing import get_worker_wallet
+
+    return SequencedWallet(get_worker_wallet(name, private_key), sequence, name, account_number, chain_id)
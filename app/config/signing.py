@@ -0,0 +1,79 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from binance_chain.environment import BinanceEnvironment
+from binance_chain.messages import Msg
+from binance_chain.wallet import Wallet
+
+from config.encoding import MsgEncoder
+from config.keys import create_wallet
+
+# private key or mnemonic and environment of each wallet
+WalletKey = Tuple[Optional[str], Optional[str], BinanceEnvironment]
+
+# wallets held by a signing worker process, created on first use, and the encoder of each wallet
+_worker_keys: Dict[str, WalletKey] = {}
+_worker_wallets: Dict[str, Wallet] = {}
+_worker_encoders: Dict[str, MsgEncoder] = {}
+
+
+def _initialise_worker(wallet_keys: Dict[str, WalletKey], template_cache_size: int):
+    _worker_keys.update(wallet_keys)
+    for name in wallet_keys:
+        _worker_encoders[name] = MsgEncoder(maxsize=template_cache_size)
+
+
+def get_worker_wallet(name: str, private_key: Optional[str] = None) -> Wallet:
+    """Wallet held by this worker, created from the private key if sent, else from the keys the worker holds"""
+    wallet = _worker_wallets.get(name)
+    if wallet:
+        return wallet
+
+    try:
+        key, mnemonic, env = _worker_keys[name]
+    except KeyError:
+        raise Exception(f"Wallet {name} is not loaded in this signing worker")
+    if private_key:
+        key, mnemonic = private_key, None
+    wallet = _worker_wallets[name] = create_wallet(key, mnemonic, env)
+    return wallet
+
+
+def _sign_msg(msg: Msg) -> bytes:
+    return _worker_encoders[msg.wallet.name].encode(msg)
+
+
+def _sign_tx(msgs: List[Msg]) -> bytes:
+    return _worker_encoders[msgs[0].wallet.name].encode_tx(msgs)
+
+
+class SigningPool:
+    """Process pool encoding and signing msgs across cores
+
+    Each worker holds the wallet keys, msgs are sent with a reference to their wallet and returned as hex data.
+    Wallets not yet derived when the pool starts are sent as their mnemonic, msgs of those wallets carry the private
+    key derived by the service so workers don't derive it again.
+
+    """
+
+    def __init__(self, workers: int, wallet_keys: Dict[str, WalletKey], template_cache_size: int = 256):
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers, initializer=_initialise_worker, initargs=(wallet_keys, template_cache_size)
+        )
+        self._mnemonic_wallets = {name for name, (private_key, _, _) in wallet_keys.items() if not private_key}
+
+    def needs_key(self, name: str) -> bool:
+        """Check if the workers only hold the mnemonic of the wallet"""
+        return name in self._mnemonic_wallets
+
+    async def sign(self, msg: Msg) -> bytes:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, _sign_msg, msg)
+
+    async def sign_tx(self, msgs: List[Msg]) -> bytes:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, _sign_tx, msgs)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -1,43 +1,145 @@
 import os
 import logging
+from typing import Dict, Optional
 
 import yaml
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
 from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Match
 
 from config.config import ServiceConfig
+from config.reload import ConfigReloader
 from api.api import api_router
+from api.security.auth import get_password_verifier, shutdown_password_verifier
+from api.utils.admission import admit_request, is_counted_path, is_priority_path
+from api.utils.cache import LRUCache
+from api.utils.logging import setup_logging, stop_logging, update_logging
+from api.utils.metrics import CONTENT_TYPE, REQUEST_SECONDS, render, start_request_timer
 
 logging.basicConfig()
-logging.getLogger().setLevel(logging.DEBUG)
 
 
 app = FastAPI(title="Binance Chain Signing Service", openapi_url="/api/openapi.json")
 config: ServiceConfig()
+config_file = os.getenv("CONFIG_FILE", '../config/config.yml')
+config_reloader: Optional[ConfigReloader] = None
+
+
+def load_config_file() -> Dict:
+    with open(config_file, 'r') as ymlfile:
+        return yaml.load(ymlfile, Loader=yaml.FullLoader)
+
+
+async def reload_config():
+    """Reload the config file, keeping wallets and connections that did not change"""
+    previous = ServiceConfig().settings
+    await ServiceConfig.reload_config(config=load_config_file())
+
+    settings = ServiceConfig().settings
+    update_logging(settings)
+    if (settings.login_workers, settings.login_queue_size) != (previous.login_workers, previous.login_queue_size):
+        # started again with the new settings on the next login
+        shutdown_password_verifier()
 
 
 @app.on_event("startup")
 async def startup_event():
-    global config
+    global config, config_reloader
     # load config
-    with open('../config/config.yml', 'r') as ymlfile:
-        config_yml = yaml.load(ymlfile, Loader=yaml.FullLoader)
+    config_yml = load_config_file()
 
     # convert settings to pydantic BaseSettings
     ServiceConfig.initialise_config(config=config_yml)
 
+    # write logs from a background thread so requests don't wait on log output
+    setup_logging(ServiceConfig().settings)
+
+    # open connections to each environment and load account details of all wallets
+    # so requests don't wait on the chain
+    await ServiceConfig.initialise_http_clients()
+    await ServiceConfig.initialise_wallets()
+
+    # start the login password verification workers
+    get_password_verifier()
+
+    # reload the config on SIGHUP or when the file changes
+    config_reloader = ConfigReloader(
+        config_file, reload_config, watch_interval=ServiceConfig().settings.config_watch_interval_seconds
+    )
+    config_reloader.start()
+
     logging.info("Signing Service Initialised and started up")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    if config_reloader:
+        await config_reloader.stop()
+    shutdown_password_verifier()
+    await ServiceConfig.shutdown()
+    stop_logging()
+
+
 app.add_middleware(ProxyHeadersMiddleware)
 
 
+# route template of each recently requested method and path, routes are matched again on a miss
+_route_paths = LRUCache(maxsize=1024)
+
+
+def route_path(request: Request) -> str:
+    # label by route template rather than path to keep the number of series bounded
+    key = (request.method, request.url.path)
+    path = _route_paths.get(key)
+    if path is None:
+        path = 'other'
+        for route in app.router.routes:
+            match, _ = route.matches(request)
+            if match == Match.FULL:
+                path = route.path
+                break
+        _route_paths.set(key, path)
+    return path
+
+
+@app.middleware("http")
+async def shed_load(request: Request, call_next):
+    # runs inside the metrics middleware so rejected requests are recorded
+    if not is_counted_path(request.url.path):
+        return await call_next(request)
+    try:
+        with admit_request(priority=is_priority_path(request.url.path)):
+            return await call_next(request)
+    except HTTPException as e:
+        return JSONResponse({'detail': e.detail}, status_code=e.status_code, headers={'retry-after': '1'})
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    route = route_path(request)
+    timer = start_request_timer(route)
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        REQUEST_SECONDS.labels(request.method, route, status).observe(timer.elapsed())
+
+
 @app.get("/")
 def read_root():
     return {}
 
 
+@app.get("/metrics")
+def read_metrics():
+    return Response(render(), media_type=CONTENT_TYPE)
+
+
 # CORS
 origins = []
 
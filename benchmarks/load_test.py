@@ -0,0 +1,466 @@
+"""Load test of the sign and broadcast routes against a stub node
+
+Starts the stub node and the service with a generated config, then runs each scenario at each concurrency level
+and writes a json report of throughput and latency.
+
+The login storm scenarios run a sign route while other clients log in as fast as they can, so the latency of
+signing can be compared with the plain sign scenarios while password verification competes for the cores.
+
+The stream scenarios send their requests over one `/api/stream` websocket, with as many in flight as the concurrency
+level. The cancel all scenario refreshes from the stub node on each request, which lists `--open-orders` orders.
+
+Tx confirmation polling and background open order syncs are off, so they don't skew the routes measured, pass
+`tx_poll_interval_ms` or `open_order_sync_interval_seconds` in `--settings` to include them.
+
+A previous report can be passed to compare against, the run exits with an error if throughput drops or p99
+latency rises by more than the tolerance.
+
+Requires the service requirements, run from the repository root
+
+.. code:: bash
+
+    python benchmarks/load_test.py --concurrency 1,8,32 --requests 500 --output report.json
+    python benchmarks/load_test.py --compare report.json
+
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+import yaml
+from passlib.context import CryptContext
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# sample testnet key from config/config.yml
+PRIVATE_KEY = '3dcc267e1f7edca86e03f0963b2d0b7804552d3014caddcfc435a4d7bc240cf5'
+ADDRESS = 'tbnb10a6kkxlf823w9lwr6l9hzw4uyphcw7qzrud5rr'
+ORDER_ID = '7F756B1BE93AA2E2FDC3D7CB713ABC206F877802-1'
+USERNAME = 'bench'
+PASSWORD = 'bench'
+WALLET = 'bench_wallet'
+
+ORDER = {
+    "symbol": "ANN-457_BNB",
+    "time_in_force": 1,
+    "order_type": 2,
+    "side": 1,
+    "price": 0.000396,
+    "quantity": 10,
+}
+LADDER = {
+    "symbol": "ANN-457_BNB",
+    "time_in_force": 1,
+    "order_type": 2,
+    "side": 1,
+    "levels": [{"price": 0.000396 + idx * 0.000001, "quantity": 10} for idx in range(5)],
+}
+CANCEL = {"symbol": "ANN-457_BNB", "order_id": ORDER_ID}
+CANCEL_ALL = {"symbol": "ANN-457_BNB"}
+TRANSFER = {"symbol": "BNB", "amount": 1, "to_address": ADDRESS, "memo": ""}
+FREEZE = {"symbol": "BNB", "amount": 1}
+
+SCENARIOS: Dict[str, Tuple[str, Dict]] = {
+    'order_sign': ('/api/order/sign', {"msg": ORDER}),
+    'order_broadcast': ('/api/order/broadcast', {"msg": ORDER}),
+    'order_broadcast_queued': ('/api/order/broadcast?queue=true', {"msg": ORDER}),
+    'order_batch_sign': ('/api/order/sign/batch', {"msgs": [ORDER] * 5}),
+    'order_batch_broadcast': ('/api/order/broadcast/batch', {"msgs": [ORDER] * 5}),
+    'order_ladder_sign': ('/api/order/ladder/sign', {"msg": LADDER}),
+    'order_ladder_broadcast': ('/api/order/ladder/broadcast', {"msg": LADDER}),
+    'cancel_order_sign': ('/api/order/cancel/sign/', {"msg": CANCEL}),
+    'cancel_order_broadcast': ('/api/order/cancel/broadcast', {"msg": CANCEL}),
+    'cancel_all_broadcast': ('/api/order/cancel/all/broadcast?refresh=true', CANCEL_ALL),
+    'transfer_sign': ('/api/transfer/sign', {"msg": TRANSFER}),
+    'transfer_broadcast': ('/api/transfer/broadcast', {"msg": TRANSFER}),
+    'freeze_sign': ('/api/freeze/sign', {"msg": FREEZE}),
+    'freeze_broadcast': ('/api/freeze/broadcast', {"msg": FREEZE}),
+    'unfreeze_sign': ('/api/unfreeze/sign', {"msg": FREEZE}),
+    'unfreeze_broadcast': ('/api/unfreeze/broadcast', {"msg": FREEZE}),
+    'order_sign_login_storm': ('/api/order/sign', {"msg": ORDER}),
+    'transfer_sign_login_storm': ('/api/transfer/sign', {"msg": TRANSFER}),
+    'stream_order_sign': ('/api/stream', {"action": "order/sign", "data": {"msg": ORDER}}),
+    'stream_order_broadcast': ('/api/stream', {"action": "order/broadcast", "data": {"msg": ORDER}}),
+}
+# scenarios run while other clients keep logging in
+LOGIN_STORM_SCENARIOS = {'order_sign_login_storm', 'transfer_sign_login_storm'}
+# scenarios sending their body as messages of a websocket stream
+STREAM_SCENARIOS = {'stream_order_sign', 'stream_order_broadcast'}
+
+# background polling of the node skews the measured routes unless enabled with --settings
+DEFAULT_SETTINGS = {
+    'tx_poll_interval_ms': 0,
+    'open_order_sync_interval_seconds': 0,
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def write_config(path: str, node_url: str, settings: Dict):
+    config = {
+        'wallets': [{
+            'private_key': PRIVATE_KEY,
+            'env_name': 'TESTNET',
+            'api_url': node_url,
+            'name': WALLET,
+            'permissions': ['trade', 'transfer', 'freeze'],
+        }],
+        'users': [{
+            'username': USERNAME,
+            'password_hash': CryptContext(schemes=["bcrypt"]).hash(PASSWORD),
+            'wallet_permissions': [{'wallet_name': WALLET, 'permissions': ['trade', 'transfer', 'freeze']}],
+        }],
+        'secret_key': 'benchmark-secret-key-not-for-production',
+        'log_level': 'WARNING',
+    }
+    config.update(DEFAULT_SETTINGS)
+    config.update(settings)
+    with open(path, 'w') as f:
+        yaml.safe_dump(config, f)
+
+
+async def wait_for(url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(url) as res:
+                    if res.status < 500:
+                        return
+            except aiohttp.ClientError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{url} did not start")
+            await asyncio.sleep(0.2)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0
+    idx = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[idx]
+
+
+def summarise(latencies: List[float], statuses: Dict[int, int], requests: int, duration: float) -> Dict:
+    latencies.sort()
+    return {
+        'requests': requests,
+        'errors': requests - statuses.get(200, 0),
+        'statuses': {str(k): v for k, v in sorted(statuses.items())},
+        'duration_s': duration,
+        'throughput_rps': requests / duration,
+        'latency_ms': {
+            'mean': sum(latencies) / len(latencies) * 1000,
+            'p50': percentile(latencies, 50) * 1000,
+            'p90': percentile(latencies, 90) * 1000,
+            'p99': percentile(latencies, 99) * 1000,
+            'max': latencies[-1] * 1000,
+        },
+    }
+
+
+async def run_scenario(session: aiohttp.ClientSession, base_url: str, headers: Dict, path: str, body: Dict,
+                       concurrency: int, requests: int) -> Dict:
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    data = json.dumps(body)
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                async with session.post(base_url + path, data=data, headers=headers) as res:
+                    await res.read()
+                    status = res.status
+            except aiohttp.ClientError:
+                status = 0
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return summarise(latencies, statuses, requests, time.perf_counter() - start)
+
+
+async def run_stream_scenario(session: aiohttp.ClientSession, base_url: str, headers: Dict, path: str, body: Dict,
+                              concurrency: int, requests: int) -> Dict:
+    """Send requests over one websocket stream with up to concurrency in flight, the status is that of the response"""
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    remaining = iter(range(requests))
+    pending: Dict[str, asyncio.Future] = {}
+    loop = asyncio.get_event_loop()
+
+    url = 'ws' + base_url[len('http'):] + path
+    async with session.ws_connect(url, headers={'Authorization': headers['Authorization']}) as ws:
+        auth = await ws.receive_json()
+        if auth.get('status') != 200:
+            raise RuntimeError(f"stream authentication failed: {auth}")
+
+        async def reader():
+            async for msg in ws:
+                response = json.loads(msg.data)
+                future = pending.pop(response.get('id'), None)
+                if future:
+                    future.set_result(response.get('status', 0))
+            # the stream closed, fail the requests still waiting
+            for future in pending.values():
+                future.set_result(0)
+
+        async def worker():
+            for idx in remaining:
+                request_id = str(idx)
+                pending[request_id] = loop.create_future()
+                start = time.perf_counter()
+                await ws.send_str(json.dumps(dict(body, id=request_id)))
+                status = await pending[request_id]
+                latencies.append(time.perf_counter() - start)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        reading = asyncio.ensure_future(reader())
+        try:
+            start = time.perf_counter()
+            await asyncio.gather(*[worker() for _ in range(concurrency)])
+            duration = time.perf_counter() - start
+        finally:
+            reading.cancel()
+    return summarise(latencies, statuses, requests, duration)
+
+
+async def login_storm(session: aiohttp.ClientSession, base_url: str, concurrency: int, stop: asyncio.Event) -> Dict:
+    """Log in from concurrent clients until stopped"""
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    data = json.dumps({'username': USERNAME, 'password': PASSWORD})
+    headers = {'Content-Type': 'application/json'}
+
+    async def worker():
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                async with session.post(base_url + '/api/auth/login', data=data, headers=headers) as res:
+                    await res.read()
+                    status = res.status
+            except aiohttp.ClientError:
+                status = 0
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+
+    latencies.sort()
+    return {
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'statuses': {str(k): v for k, v in sorted(statuses.items())},
+        'latency_ms': {
+            'p50': percentile(latencies, 50) * 1000,
+            'p99': percentile(latencies, 99) * 1000,
+        },
+    }
+
+
+async def run_login_storm_scenario(session: aiohttp.ClientSession, base_url: str, headers: Dict, path: str,
+                                   body: Dict, concurrency: int, requests: int, login_concurrency: int) -> Dict:
+    """Run a scenario while logins hammer the service, the result is the latency of the scenario requests"""
+    stop = asyncio.Event()
+    storm = asyncio.ensure_future(login_storm(session, base_url, login_concurrency, stop))
+    try:
+        result = await run_scenario(session, base_url, headers, path, body, concurrency, requests)
+    finally:
+        stop.set()
+    result['logins'] = await storm
+    return result
+
+
+async def run(args, base_url: str) -> List[Dict]:
+    results = []
+    headers = {'Content-Type': 'application/json'}
+    connector = aiohttp.TCPConnector(limit=max(args.concurrency) + args.login_concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        login = {'username': USERNAME, 'password': PASSWORD}
+        async with session.post(base_url + '/api/auth/login', data=json.dumps(login), headers=headers) as res:
+            res.raise_for_status()
+            headers['Authorization'] = f"Bearer {(await res.json())['access_token']}"
+
+        for name in args.scenarios:
+            path, body = SCENARIOS[name]
+            if name in STREAM_SCENARIOS:
+                body = dict(body, data=dict(body['data'], wallet_name=WALLET))
+                scenario = run_stream_scenario
+            else:
+                body = dict(body, wallet_name=WALLET)
+                scenario = run_scenario
+            if args.warmup:
+                await scenario(session, base_url, headers, path, body, 1, args.warmup)
+            for concurrency in args.concurrency:
+                if name in LOGIN_STORM_SCENARIOS:
+                    result = await run_login_storm_scenario(
+                        session, base_url, headers, path, body, concurrency, args.requests, args.login_concurrency
+                    )
+                else:
+                    result = await scenario(session, base_url, headers, path, body, concurrency, args.requests)
+                result.update(scenario=name, path=path, concurrency=concurrency)
+                results.append(result)
+                print(
+                    f"{name:24} c={concurrency:<4} {result['throughput_rps']:9.1f} req/s"
+                    f"  p50 {result['latency_ms']['p50']:7.2f} ms  p99 {result['latency_ms']['p99']:7.2f} ms"
+                    f"  errors {result['errors']}"
+                )
+                if 'logins' in result:
+                    logins = result['logins']
+                    print(
+                        f"{'':24} logins {logins['requests']} at c={logins['concurrency']}"
+                        f"  p50 {logins['latency_ms']['p50']:7.2f} ms  p99 {logins['latency_ms']['p99']:7.2f} ms"
+                        f"  statuses {logins['statuses']}"
+                    )
+    return results
+
+
+def compare(results: List[Dict], baseline: Dict, tolerance: float) -> List[str]:
+    previous = {(r['scenario'], r['concurrency']): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        prev = previous.get((result['scenario'], result['concurrency']))
+        if not prev:
+            continue
+        label = f"{result['scenario']} c={result['concurrency']}"
+        if result['throughput_rps'] < prev['throughput_rps'] * (1 - tolerance):
+            regressions.append(
+                f"{label} throughput {result['throughput_rps']:.1f} req/s was {prev['throughput_rps']:.1f} req/s"
+            )
+        if result['latency_ms']['p99'] > prev['latency_ms']['p99'] * (1 + tolerance):
+            regressions.append(
+                f"{label} p99 {result['latency_ms']['p99']:.2f} ms was {prev['latency_ms']['p99']:.2f} ms"
+            )
+        if result['errors'] > prev['errors']:
+            regressions.append(f"{label} errors {result['errors']} was {prev['errors']}")
+    return regressions
+
+
+def uvicorn_command() -> str:
+    # prefer the uvicorn installed alongside this python
+    command = os.path.join(os.path.dirname(sys.executable), 'uvicorn')
+    return command if os.path.exists(command) else 'uvicorn'
+
+
+def git_revision() -> Optional[str]:
+    try:
+        revision = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, stderr=subprocess.DEVNULL)
+        return revision.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"comma separated scenarios, from {', '.join(SCENARIOS)}")
+    parser.add_argument('--concurrency', default='1,8,32', help="comma separated concurrency levels")
+    parser.add_argument('--requests', type=int, default=500, help="requests per scenario and concurrency level")
+    parser.add_argument('--warmup', type=int, default=20, help="requests before each scenario")
+    parser.add_argument('--login-concurrency', type=int, default=8, help="clients logging in during login storms")
+    parser.add_argument('--latency-ms', type=float, default=2, help="stub node account and info latency")
+    parser.add_argument('--broadcast-latency-ms', type=float, default=10, help="stub node broadcast latency")
+    parser.add_argument('--open-orders', type=int, default=5, help="stub node open orders of the wallet")
+    parser.add_argument('--workers', type=int, default=1, help="service worker processes")
+    parser.add_argument('--settings', default='{}', help="json of extra service settings, e.g. signing_workers")
+    parser.add_argument('--output', default='benchmark-report.json')
+    parser.add_argument('--compare', help="previous report to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="allowed regression as a fraction")
+    args = parser.parse_args()
+
+    args.scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios {', '.join(sorted(unknown))}")
+    args.concurrency = [int(c) for c in args.concurrency.split(',')]
+    args.settings = json.loads(args.settings)
+    return args
+
+
+def main():
+    args = parse_args()
+
+    node_port = free_port()
+    app_port = free_port()
+    node_url = f'http://127.0.0.1:{node_port}'
+    base_url = f'http://127.0.0.1:{app_port}'
+
+    processes = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        config_file = os.path.join(tmp_dir, 'config.yml')
+        write_config(config_file, node_url, args.settings)
+
+        try:
+            processes.append(subprocess.Popen([
+                sys.executable, os.path.join(ROOT, 'benchmarks', 'stub_node.py'), '--port', str(node_port),
+                '--latency-ms', str(args.latency_ms), '--broadcast-latency-ms', str(args.broadcast_latency_ms),
+                '--open-orders', str(args.open_orders),
+            ]))
+            processes.append(subprocess.Popen(
+                [
+                    uvicorn_command(), 'main:app', '--port', str(app_port),
+                    '--workers', str(args.workers), '--log-level', 'warning',
+                ],
+                cwd=os.path.join(ROOT, 'app'),
+                env=dict(os.environ, CONFIG_FILE=config_file),
+            ))
+
+            loop = asyncio.get_event_loop()
+            loop.run_until_complete(wait_for(node_url + '/stats'))
+            loop.run_until_complete(wait_for(base_url + '/'))
+            results = loop.run_until_complete(run(args, base_url))
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait()
+
+    report = {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'workers': args.workers,
+            'settings': dict(DEFAULT_SETTINGS, **args.settings),
+            'requests': args.requests,
+            'node_latency_ms': args.latency_ms,
+            'node_broadcast_latency_ms': args.broadcast_latency_ms,
+            'node_open_orders': args.open_orders,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"report written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("regressions against", args.compare)
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("no regressions against", args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Benchmark of signing order and cancel msgs with cached templates against to_hex_data()
+
+Checks both paths give the same hex data, then reports the time per msg of each path.
+
+Requires the service requirements, run from the repository root
+
+.. code:: bash
+
+    python benchmarks/msg_encoding.py --msgs 5000
+
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+
+from binance_chain.constants import OrderSide, OrderType, TimeInForce  # noqa: E402
+from binance_chain.environment import BinanceEnvironment  # noqa: E402
+from binance_chain.messages import CancelOrderMsg, Msg, NewOrderMsg  # noqa: E402
+from binance_chain.wallet import Wallet  # noqa: E402
+
+from config.encoding import MsgEncoder  # noqa: E402
+from config.sequence import SequencedWallet  # noqa: E402
+
+# sample testnet key from config/config.yml
+PRIVATE_KEY = '3dcc267e1f7edca86e03f0963b2d0b7804552d3014caddcfc435a4d7bc240cf5'
+SYMBOLS = ['ANN-457_BNB', 'BNB_USDT.B-B7C', 'BTCB-1DE_BNB', 'ETH.B-261_BNB']
+
+
+def create_wallet() -> Wallet:
+    wallet = Wallet(PRIVATE_KEY, env=BinanceEnvironment.get_testnet_env())
+    # skip loading the account from a node
+    wallet._account_number = 1000
+    wallet._chain_id = 'Binance-Chain-Nile'
+    wallet._sequence = 0
+    return wallet
+
+
+def create_msgs(wallet: Wallet, count: int) -> Dict[str, List[Msg]]:
+    rnd = random.Random(1)
+    orders = [
+        NewOrderMsg(
+            symbol=rnd.choice(SYMBOLS), time_in_force=TimeInForce.GOOD_TILL_EXPIRE, order_type=OrderType.LIMIT,
+            side=rnd.choice([OrderSide.BUY, OrderSide.SELL]), price=round(rnd.uniform(0.0001, 0.001), 6),
+            quantity=rnd.randint(1, 1000), wallet=SequencedWallet(wallet, sequence, name='bench')
+        )
+        for sequence in range(count)
+    ]
+    cancels = [
+        CancelOrderMsg(
+            symbol=order._symbol, order_id=order.wallet.generate_order_id(),
+            wallet=SequencedWallet(wallet, count + sequence, name='bench')
+        )
+        for sequence, order in enumerate(orders)
+    ]
+    return {'order': orders, 'cancel_order': cancels}
+
+
+def run(encode: Callable[[Msg], bytes], msgs: List[Msg], rounds: int) -> float:
+    """Return the best time per msg in microseconds over the rounds"""
+    best = None
+    for _ in range(rounds):
+        start = time.process_time()
+        for msg in msgs:
+            encode(msg)
+        elapsed = time.process_time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(msgs) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--msgs', type=int, default=2000, help="msgs of each type per round")
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--output', help="write the results to a json file")
+    args = parser.parse_args()
+
+    wallet = create_wallet()
+    encoder = MsgEncoder()
+    results = {}
+    for name, msgs in create_msgs(wallet, args.msgs).items():
+        for msg in msgs:
+            if encoder.encode(msg) != msg.to_hex_data():
+                raise SystemExit(f"{name} template output differs from to_hex_data()")
+
+        to_hex_data = run(lambda m: m.to_hex_data(), msgs, args.rounds)
+        template = run(encoder.encode, msgs, args.rounds)
+        results[name] = {
+            'to_hex_data_us': round(to_hex_data, 2),
+            'template_us': round(template, 2),
+            'saving': round(1 - template / to_hex_data, 4),
+        }
+        print(f"{name:<14} to_hex_data {to_hex_data:8.2f}us  template {template:8.2f}us  "
+              f"saving {results[name]['saving']:.1%}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Micro-benchmark of wallet resolution for a sign request
+
+Compares resolving the wallet with a dependency that reads the request json, against resolving it from the
+validated request model. Requests are sent straight to the ASGI app so only the request handling is timed.
+
+Run from the app directory
+
+.. code:: bash
+
+    cd app
+    python ../benchmarks/request_parse.py
+
+"""
+import asyncio
+import inspect
+import json
+import timeit
+
+from fastapi import FastAPI, Body, Depends, HTTPException
+from starlette.requests import Request
+
+from api.models.schema import SignOrderSchema
+
+WALLETS = {'wallet_1': object()}
+
+ORDER = {
+    "msg": {
+        "order_type": 2,
+        "price": 0.000396,
+        "quantity": 10,
+        "side": 1,
+        "symbol": "ANN-457_BNB",
+        "time_in_force": 1
+    },
+    "wallet_name": "wallet_1"
+}
+
+app = FastAPI()
+
+
+async def get_wallet_from_request(request: Request):
+    body_json = await request.json()
+    wallet_name = body_json.get('wallet_name', None)
+    if not wallet_name:
+        raise HTTPException(status_code=400, detail="Expecting wallet_name parameter")
+    return WALLETS[wallet_name]
+
+
+async def get_wallet(wallet_name: str):
+    return WALLETS[wallet_name]
+
+
+@app.post("/request")
+async def request_wallet(signed_order: SignOrderSchema = Body(...), wallet=Depends(get_wallet_from_request)):
+    return {}
+
+
+@app.post("/model")
+async def model_wallet(signed_order: SignOrderSchema = Body(...)):
+    await get_wallet(signed_order.wallet_name)
+    return {}
+
+
+async def asgi_post(path: str, body: bytes):
+    scope = {
+        'type': 'http',
+        'http_version': '1.1',
+        'method': 'POST',
+        'scheme': 'http',
+        'path': path,
+        'root_path': '',
+        'query_string': b'',
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+        'client': ('127.0.0.1', 5000),
+        'server': ('127.0.0.1', 8000),
+    }
+    status = {}
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status['code'] = message['status']
+
+    if len(inspect.signature(app.__call__).parameters) == 3:
+        await app(scope, receive, send)
+    else:
+        # ASGI 2 interface
+        await app(scope)(receive, send)
+
+    assert status['code'] == 200, status
+
+
+def main(number: int = 5000, repeat: int = 5):
+    loop = asyncio.get_event_loop()
+    body = json.dumps(ORDER).encode()
+
+    results = {}
+    for path in ('/request', '/model'):
+        loop.run_until_complete(asgi_post(path, body))
+        timer = timeit.Timer(lambda: loop.run_until_complete(asgi_post(path, body)))
+        results[path] = min(timer.repeat(repeat=repeat, number=number)) / number * 1e6
+        print(f"{path:10} {results[path]:8.1f} us/request")
+    print(f"saving     {results['/request'] - results['/model']:8.1f} us/request")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Benchmark of loading a config with many mnemonic wallets
+
+Times building the service config with keys derived one after another, derived across processes and derived lazily
+on first use. Loading the accounts from a node is not included.
+
+Requires the service requirements, run from the repository root
+
+.. code:: bash
+
+    python benchmarks/startup.py --wallets 1000
+
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+
+from mnemonic import Mnemonic  # noqa: E402
+
+from config.config import ServiceConfig  # noqa: E402
+
+
+def create_config(wallet_count: int) -> Dict:
+    rnd = random.Random(1)
+    mnemonic = Mnemonic('english')
+    wallets = [
+        {
+            'mnemonic': mnemonic.to_mnemonic(bytes(rnd.getrandbits(8) for _ in range(32))),
+            'name': f'wallet_{idx}',
+            'env_name': 'TESTNET',
+            'permissions': ['trade'],
+        }
+        for idx in range(wallet_count)
+    ]
+    users = [{
+        'username': 'bench',
+        'password_hash': 'unused',
+        'wallet_permissions': [{'wallet_name': w['name'], 'permissions': ['trade']} for w in wallets],
+    }]
+    return {'wallets': wallets, 'users': users, 'secret_key': 'bench'}
+
+
+def load(config: Dict, **settings) -> ServiceConfig:
+    ServiceConfig.instance = None
+    ServiceConfig()
+    ServiceConfig.initialise_config({**config, **settings})
+    return ServiceConfig()
+
+
+def addresses(config: ServiceConfig) -> List[str]:
+    return [wallet.wallet.address for wallet in config.wallets.values()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--wallets', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=0, help="derivation processes, 0 uses one per core")
+    parser.add_argument('--output', help="write the results to a json file")
+    args = parser.parse_args()
+
+    config = create_config(args.wallets)
+    modes = {
+        'serial': {'wallet_derivation_workers': 1},
+        'parallel': {'wallet_derivation_workers': args.workers},
+        'lazy': {'lazy_wallet_derivation': True},
+    }
+
+    results = {'wallets': args.wallets, 'cpu_count': os.cpu_count()}
+    expected = None
+    for mode, settings in modes.items():
+        start = time.perf_counter()
+        service_config = load(config, **settings)
+        elapsed = time.perf_counter() - start
+        results[f'{mode}_seconds'] = round(elapsed, 3)
+        print(f"{mode:<10} {elapsed:8.3f}s")
+
+        if mode == 'lazy':
+            wallet = next(iter(service_config.wallets.values()))
+            start = time.perf_counter()
+            wallet.wallet
+            results['lazy_first_use_seconds'] = round(time.perf_counter() - start, 4)
+            print(f"{'first use':<10} {results['lazy_first_use_seconds']:8.4f}s")
+
+        # every mode must derive the same wallets
+        derived = addresses(service_config)
+        if expected is None:
+            expected = derived
+        elif derived != expected:
+            raise SystemExit(f"{mode} derived different wallets")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""Stub Binance Chain HTTP node for benchmarks
+
+Serves the account, sequence, node info, time, broadcast, tx and open orders endpoints used by the signing service,
+with a configurable latency so runs don't depend on a real node.
+
+Broadcast txs are reported committed when looked up. Each listing of open orders has new orders, as if the ones
+cancelled since had been placed again, so every cancel all request that refreshes from the node has orders to cancel.
+
+.. code:: bash
+
+    python benchmarks/stub_node.py --port 8080 --latency-ms 5 --broadcast-latency-ms 20 --open-orders 5
+
+"""
+import argparse
+import asyncio
+import hashlib
+import time
+from typing import Set
+
+from aiohttp import web
+
+ACCOUNT_NUMBER = 1000
+CHAIN_ID = 'Binance-Chain-Stub'
+BLOCK_HEIGHT = 1000
+SYMBOL = 'ANN-457_BNB'
+
+
+class StubNode:
+
+    def __init__(self, latency: float = 0, broadcast_latency: float = 0, open_orders: int = 0):
+        self._latency = latency
+        self._broadcast_latency = broadcast_latency
+        self._open_orders = open_orders
+        self._hashes: Set[str] = set()
+        self._listings = 0
+        self.broadcasts = 0
+        self.tx_lookups = 0
+        self.open_order_lookups = 0
+
+    async def _wait(self, latency: float):
+        if latency:
+            await asyncio.sleep(latency)
+
+    async def account(self, request: web.Request):
+        await self._wait(self._latency)
+        address = request.match_info['address']
+        return web.json_response({
+            'address': address,
+            'account_number': ACCOUNT_NUMBER,
+            'sequence': 0,
+            'balances': [],
+            'public_key': [],
+        })
+
+    async def account_sequence(self, request: web.Request):
+        await self._wait(self._latency)
+        return web.json_response({'sequence': 0})
+
+    async def node_info(self, request: web.Request):
+        await self._wait(self._latency)
+        return web.json_response({'node_info': {'network': CHAIN_ID}})
+
+    async def time(self, request: web.Request):
+        await self._wait(self._latency)
+        now = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        return web.json_response({'ap_time': now, 'block_time': now})
+
+    async def broadcast(self, request: web.Request):
+        hex_data = await request.read()
+        await self._wait(self._broadcast_latency)
+        self.broadcasts += 1
+        tx_hash = hashlib.sha256(hex_data).hexdigest().upper()
+        self._hashes.add(tx_hash)
+        return web.json_response([{
+            'code': 0,
+            'hash': tx_hash,
+            'log': 'Msg 0: ',
+            'ok': True,
+        }])
+
+    async def tx(self, request: web.Request):
+        await self._wait(self._latency)
+        self.tx_lookups += 1
+        tx_hash = request.match_info['hash'].upper()
+        if tx_hash not in self._hashes:
+            return web.json_response({'code': 404, 'message': 'tx not found'}, status=404)
+        return web.json_response({'hash': tx_hash, 'height': str(BLOCK_HEIGHT), 'code': 0, 'log': 'Msg 0: '})
+
+    async def open_orders(self, request: web.Request):
+        await self._wait(self._latency)
+        self.open_order_lookups += 1
+        # order ids of the node are the hex address of the wallet and the sequence the order was placed with
+        prefix = hashlib.sha1(request.query.get('address', '').encode()).hexdigest().upper()
+        symbol = request.query.get('symbol')
+        offset = int(request.query.get('offset', 0))
+        limit = int(request.query.get('limit', 500))
+        if not offset:
+            self._listings += 1
+        first = (self._listings - 1) * self._open_orders + 1
+        orders = [] if symbol and symbol != SYMBOL else [
+            {
+                'orderId': f"{prefix}-{first + idx}",
+                'symbol': SYMBOL,
+                'side': 1,
+                'price': '0.00039600',
+                'quantity': '10.00000000',
+            }
+            for idx in range(self._open_orders)
+        ]
+        page = orders[offset:offset + limit]
+        return web.json_response({'order': page, 'total': len(orders)})
+
+    async def stats(self, request: web.Request):
+        return web.json_response({
+            'broadcasts': self.broadcasts,
+            'tx_lookups': self.tx_lookups,
+            'open_order_lookups': self.open_order_lookups,
+        })
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/api/v1/account/{address}', self.account)
+        app.router.add_get('/api/v1/account/{address}/sequence', self.account_sequence)
+        app.router.add_get('/api/v1/node-info', self.node_info)
+        app.router.add_get('/api/v1/time', self.time)
+        app.router.add_post('/api/v1/broadcast', self.broadcast)
+        app.router.add_get('/api/v1/tx/{hash}', self.tx)
+        app.router.add_get('/api/v1/orders/open', self.open_orders)
+        app.router.add_get('/stats', self.stats)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency-ms', type=float, default=0, help="latency of account and info requests")
+    parser.add_argument('--broadcast-latency-ms', type=float, default=0, help="latency of broadcast requests")
+    parser.add_argument('--open-orders', type=int, default=5, help="open orders listed for every address")
+    args = parser.parse_args()
+
+    node = StubNode(
+        latency=args.latency_ms / 1000, broadcast_latency=args.broadcast_latency_ms / 1000,
+        open_orders=args.open_orders
+    )
+    web.run_app(node.app(), host=args.host, port=args.port, access_log=None, print=None)
+
+
+if __name__ == '__main__':
+    main()
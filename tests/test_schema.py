@@ -0,0 +1,68 @@
+"""Tests of the request schemas
+
+Requires the service requirements, run from the repository root
+
+.. code:: bash
+
+    python -m unittest discover tests
+
+"""
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+
+from pydantic import ValidationError  # noqa: E402
+
+from api.models.schema import OrderLadderSchema, SignOrderBatchSchema  # noqa: E402
+from config.config import ServiceConfig  # noqa: E402
+
+# sample testnet key from config/config.yml
+PRIVATE_KEY = '3dcc267e1f7edca86e03f0963b2d0b7804552d3014caddcfc435a4d7bc240cf5'
+
+ORDER = {
+    'symbol': 'ANN-457_BNB',
+    'time_in_force': 1,
+    'order_type': 2,
+    'side': 1,
+    'price': 0.000396,
+    'quantity': 10,
+}
+
+
+class BatchSizeTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        ServiceConfig().initialise_config({
+            'max_batch_msgs': 3,
+            'wallets': [{
+                'name': 'wallet_1', 'private_key': PRIVATE_KEY, 'env_name': 'TESTNET', 'permissions': ['trade']
+            }],
+            'users': [],
+        })
+
+    def test_batch_at_limit(self):
+        schema = SignOrderBatchSchema(msgs=[ORDER] * 3, wallet_name='wallet_1')
+        self.assertEqual(len(schema.msgs), 3)
+
+    def test_batch_over_limit(self):
+        with self.assertRaises(ValidationError):
+            SignOrderBatchSchema(msgs=[ORDER] * 4, wallet_name='wallet_1')
+
+    def test_empty_batch(self):
+        with self.assertRaises(ValidationError):
+            SignOrderBatchSchema(msgs=[], wallet_name='wallet_1')
+
+    def test_ladder_over_limit(self):
+        ladder = {k: v for k, v in ORDER.items() if k not in ('price', 'quantity')}
+        levels = [{'price': ORDER['price'], 'quantity': ORDER['quantity']}] * 4
+        with self.assertRaises(ValidationError):
+            OrderLadderSchema(levels=levels, **ladder)
+        self.assertEqual(len(OrderLadderSchema(levels=levels[:3], **ladder).levels), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()